@@ -1,43 +1,73 @@
 
+import heapq
+import itertools
 import math
+import mmap
+import os
+import random
 import sys
+import tempfile
 import time as t
-B=4
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import numpy as np # only needed for the batch query API and the streaming loader
+except ImportError:
+    np = None
+B=4 # default node capacity, each tree can choose its own
+
+# on-disk page layout used by RTree.save / MappedRTree, all values are native int32:
+# page 0 holds the file header, every node takes one fixed-size page after it (the root is page 1).
+# a node page starts with [is_leaf, count] followed by count records of RECORD_INTS values,
+# [child page, x1, y1, x2, y2, points under child] for internal nodes and [id, x, y, 0, 0, 0] for leaves
+PAGE_MAGIC = b'RTREEPG2'
+PAGE_BYTE_ORDER = 0x01020304 # reads back differently on a machine with the other byte order
+NODE_HEADER_INTS = 2
+RECORD_INTS = 6
 
 def main():
 
-    points =[]
-    n=0
-    with open("dataset.txt", 'r') as dataset: #insert datapoints into a dictionary
-        for data in dataset.readlines():
-            data = data.split()
-            points.append({
-                'id': int(data[0]),
-                'x': int(data[1]),
-                'y': int(data[2])
-            })
-            n=n+1
-
-    queries = []
-    m=0
-    with open("test_query.txt", 'r') as dataset: #insert query points into a dictionary
-        for data in dataset.readlines():
-            data = data.split()
-            queries.append({
-                'x1': int(data[0]),
-                'x2': int(data[1]),
-                'y1': int(data[2]),
-                'y2': int(data[3])
-            })
-            m=m+1 
+    points = read_points("dataset.txt")
+    queries = read_queries("test_query.txt")
 
     print("\n")
     print("build R-Tree:")
 
-    #R-Tree construction
-    rtree = RTree()
+    #R-Tree construction, one insert per point
+    start_build = t.time()
+    rtree_inserted = RTree()
     for point in points:
-        rtree.insert(rtree.root, point)
+        rtree_inserted.insert(rtree_inserted.root, point)
+    end_build = t.time()
+    print("time for insertion build:", end_build - start_build)
+
+    #R*-tree construction, one insert per point
+    start_build = t.time()
+    rtree_rstar = RTree(rstar=True)
+    for point in points:
+        rtree_rstar.insert(rtree_rstar.root, point)
+    end_build = t.time()
+    print("time for R*-tree insertion build:", end_build - start_build)
+
+    #R-Tree construction with Sort-Tile-Recursive bulk loading
+    start_build = t.time()
+    rtree = RTree.bulk_load(points)
+    end_build = t.time()
+    print("time for bulk-load build:", end_build - start_build)
+
+    #R-Tree construction straight from the file, parsed in chunks into NumPy arrays
+    if np is not None:
+        start_build = t.time()
+        RTree.from_file("dataset.txt")
+        end_build = t.time()
+        print("time for chunked file load and bulk-load build:", end_build - start_build)
+
+    #R-Tree construction with one bulk-loaded sub-tree per tile, built in worker processes
+    start_build = t.time()
+    rtree_parallel = RTree.bulk_load_parallel(points)
+    end_build = t.time()
+    print("time for parallel bulk-load build (" + str(os.cpu_count()) + " workers):", end_build - start_build)
 
     print("Done!")
     print("\n")
@@ -97,14 +127,264 @@ def main():
     Efficiency = total_time_ss/total_time_R_Tree    
 
     print("R-Tree is", Efficiency, "times faster than sequential query")
+    print("\n")
+
+    #Re-issue the same queries against an R-Tree with a query result cache, then insert a point inside the first query
+    rtree_cached = RTree.bulk_load(points)
+    rtree_cached.set_cache_size(len(queries))
+    start_cached = t.time()
+    for repeat in range(2):
+        results_cached = [rtree_cached.query(rtree_cached.root, query) for query in queries]
+    end_cached = t.time()
+    new_point = {'id': -1, 'x': queries[0]['x1'], 'y': queries[0]['y1']}
+    rtree_cached.insert(rtree_cached.root, new_point)
+    print("time for two passes over the queries with the result cache:", end_cached - start_cached)
+    print("cached R-Tree results match R-Tree results:", results_cached == results_R_Tree)
+    print("cached results left after inserting a point into the first query:", rtree_cached.cache_info()['size'], "of", len(queries))
+    print("first query counts the new point:", rtree_cached.query(rtree_cached.root, queries[0]) == results_R_Tree[0] + 1)
+    print("cache counters:", rtree_cached.cache_info())
+    print("\n")
+
+    #Compare how many nodes each construction method makes a query visit
+    print("average node visits per query, dataset.txt:")
+    print("  insertion build:", average_node_visits(rtree_inserted, queries))
+    print("  R*-tree insertion build:", average_node_visits(rtree_rstar, queries))
+    print("  bulk-load build:", average_node_visits(rtree, queries))
+    clustered = clustered_points(20000)
+    rtree_clustered = RTree()
+    rtree_clustered_rstar = RTree(rstar=True)
+    for point in clustered:
+        rtree_clustered.insert(rtree_clustered.root, point)
+        rtree_clustered_rstar.insert(rtree_clustered_rstar.root, point)
+    print("average node visits per query, 20000 clustered points:")
+    print("  insertion build:", average_node_visits(rtree_clustered, queries))
+    print("  R*-tree insertion build:", average_node_visits(rtree_clustered_rstar, queries))
+    print("\n")
+
+    #Freeze the R-Tree into typed arrays and run the same queries against the compact copy
+    packed = rtree.pack()
+    results_packed = []
+    start_packed = t.time()
+    for query in queries:
+        results_packed.append(packed.query(packed.root, query))
+    end_packed = t.time()
+    total_time_packed = end_packed - start_packed
+
+    print("total time for packed R-Tree queries:", total_time_packed)
+    print("average time for packed R-Tree query:", total_time_packed/len(queries))
+    print("packed R-Tree results match R-Tree results:", results_packed == results_R_Tree)
+    print("\n")
+
+    #Answer all queries in one vectorised call
+    if np is not None:
+        query_array = np.array([[query['x1'], query['x2'], query['y1'], query['y2']] for query in queries])
+        start_batch = t.time()
+        results_batch = packed.query_batch(query_array)
+        end_batch = t.time()
+        total_time_batch = end_batch - start_batch
+
+        print("total time for batch R-Tree queries:", total_time_batch)
+        print("average time for batch R-Tree query:", total_time_batch/len(queries))
+        print("batch R-Tree results match R-Tree results:", results_batch.tolist() == results_R_Tree)
+    else:
+        print("NumPy is not installed, skipping batch R-Tree queries")
+    print("\n")
+
+    #Answer all queries against the parallel-built tree, fanned out across worker processes
+    query_rows = [[query['x1'], query['x2'], query['y1'], query['y2']] for query in queries]
+    start_parallel = t.time()
+    results_parallel = rtree_parallel.query_parallel(query_rows)
+    end_parallel = t.time()
+
+    print("total time for parallel R-Tree queries, including worker start-up:", end_parallel - start_parallel)
+    print("parallel R-Tree results match R-Tree results:", results_parallel == results_R_Tree)
+
+    #All (query, point) pairs at once: spatial join of the points against an R-Tree over the query rectangles
+    rectangles = RectangleRTree.bulk_load([dict(query, id=i) for i, query in enumerate(queries)])
+    start_join = t.time()
+    results_join = [0] * len(queries)
+    for query_id, point_id in rtree.spatial_join(rectangles):
+        results_join[query_id] = results_join[query_id] + 1
+    end_join = t.time()
+    start_nested = t.time()
+    pairs_nested = 0
+    for query in queries:
+        for point_id in rtree.search(query):
+            pairs_nested = pairs_nested + 1
+    end_nested = t.time()
+
+    print("time for spatial join of all queries:", end_join - start_join)
+    print("time for one R-Tree search per query:", end_nested - start_nested)
+    print("spatial join results match R-Tree results:", results_join == results_R_Tree and sum(results_join) == pairs_nested)
+    print("\n")
+
+    #Same queries through the other SpatialIndex implementations
+    for index_type in (GridIndex, QuadTree):
+        start_build = t.time()
+        index = index_type.build(points)
+        end_build = t.time()
+        results_index = []
+        start_index = t.time()
+        for query in queries:
+            results_index.append(index.count(query))
+        end_index = t.time()
+        total_time_index = end_index - start_index
+
+        print("time for " + index_type.__name__ + " build:", end_build - start_build)
+        print("total time for " + index_type.__name__ + " queries:", total_time_index)
+        print("average time for " + index_type.__name__ + " query:", total_time_index/len(queries))
+        print(index_type.__name__ + " results match R-Tree results:", results_index == results_R_Tree)
+        print("\n")
+
+    #Save the R-Tree to a paged file and query it straight from the memory-mapped pages
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rtree.idx")
+        rtree.save(path)
+        start_open = t.time()
+        mapped = RTree.open(path)
+        end_open = t.time()
+        results_mapped = []
+        start_mapped = t.time()
+        for query in queries:
+            results_mapped.append(mapped.query(mapped.root, query))
+        end_mapped = t.time()
+        mapped.close()
+        total_time_mapped = end_mapped - start_mapped
+
+        print("size of saved R-Tree file:", os.path.getsize(path), "bytes")
+        print("time to open saved R-Tree:", end_open - start_open)
+        print("total time for memory-mapped R-Tree queries:", total_time_mapped)
+        print("average time for memory-mapped R-Tree query:", total_time_mapped/len(queries))
+        print("memory-mapped R-Tree results match R-Tree results:", results_mapped == results_R_Tree)
+        print("\n")
+
+    #k-nearest-neighbour queries around the centre of every query rectangle
+    k = 10
+    centres = [((query['x1'] + query['x2']) / 2, (query['y1'] + query['y2']) / 2) for query in queries]
+
+    results_knn_ss = []
+    start_knn_ss = t.time()
+    for x, y in centres:
+        #Compute the distance to every point and keep the k smallest
+        results_knn_ss.append(heapq.nsmallest(k, (math.hypot(point['x'] - x, point['y'] - y) for point in points)))
+    end_knn_ss = t.time()
+    total_time_knn_ss = end_knn_ss - start_knn_ss
+
+    print("total time for sequential " + str(k) + "-NN queries:", total_time_knn_ss)
+    print("average time for sequential " + str(k) + "-NN query:", total_time_knn_ss/len(centres))
+    print("\n")
+
+    results_knn_R_Tree = []
+    start_knn_R_Tree = t.time()
+    for x, y in centres:
+        results_knn_R_Tree.append([distance for distance, point_id in rtree.nearest(x, y, k)])
+    end_knn_R_Tree = t.time()
+    total_time_knn_R_Tree = end_knn_R_Tree - start_knn_R_Tree
+
+    print("total time for R-Tree " + str(k) + "-NN queries:", total_time_knn_R_Tree)
+    print("average time for R-Tree " + str(k) + "-NN query:", total_time_knn_R_Tree/len(centres))
+    print("R-Tree " + str(k) + "-NN results match sequential results:", results_knn_R_Tree == results_knn_ss)
+    print("R-Tree is", total_time_knn_ss/total_time_knn_R_Tree, "times faster than sequential " + str(k) + "-NN query")
+    print("\n")
 
     #Return text file containing range query results of sequential scan method and R_Tree method
     file = open('query_result.txt', 'w')
-    for i in range(1,101):
+    for i in range(1, len(queries) + 1):
         file.write("Query Number: " + str(i) + " Sequential Scan Result: " + str(results_ss[i-1]) + " R-Tree Result: " + str(results_R_Tree[i-1]) + "\n")
     file.close()
 
+def read_points(path): #read "id x y" lines into a list of data point dictionaries
+    points = []
+    with open(path, 'r') as dataset:
+        for data in dataset.readlines():
+            data = data.split()
+            points.append({
+                'id': int(data[0]),
+                'x': int(data[1]),
+                'y': int(data[2])
+            })
+    return points
+
+def iter_point_chunks(path, chunk_size=1000000): #read "id x y" lines chunk_size at a time, yielding (ids, xs, ys) NumPy arrays
+    if np is None:
+        raise ImportError("iter_point_chunks requires NumPy")
+    with open(path, 'r') as dataset:
+        while True:
+            lines = list(itertools.islice(dataset, chunk_size))
+            if lines.__len__() == 0:
+                return
+            lines = [line for line in lines if line.strip()] #blank lines, e.g. trailing newlines, carry no point
+            if lines.__len__() == 0:
+                continue
+            # parse the whole chunk in one call, rather than one split() and dictionary per line
+            data = np.loadtxt(lines, dtype=np.int32, usecols=(0, 1, 2), ndmin=2)
+            yield data[:, 0].copy(), data[:, 1].copy(), data[:, 2].copy()
+
+def read_queries(path): #read "x1 x2 y1 y2" lines into a list of query dictionaries
+    queries = []
+    with open(path, 'r') as dataset:
+        for data in dataset.readlines():
+            data = data.split()
+            queries.append({
+                'x1': int(data[0]),
+                'x2': int(data[1]),
+                'y1': int(data[2]),
+                'y2': int(data[3])
+            })
+    return queries
+
+def uniform_points(n, seed=0): #n points spread uniformly over the 0-100000 square, like dataset.txt
+    rng = random.Random(seed)
+    return [{'id': i + 1, 'x': rng.randint(0, 100000), 'y': rng.randint(0, 100000)} for i in range(n)]
+
+def skewed_points(n, skew=3, seed=0): #n points crowding towards the origin, the density grows as u ** skew flattens
+    rng = random.Random(seed)
+    return [{'id': i + 1, 'x': int(100000 * rng.random() ** skew), 'y': int(100000 * rng.random() ** skew)} for i in range(n)]
+
+def clustered_points(n, num_clusters=20, spread=1500, seed=0): #n points drawn around random cluster centres in the 0-100000 square
+    rng = random.Random(seed)
+    centres = [(rng.randint(0, 100000), rng.randint(0, 100000)) for _ in range(num_clusters)]
+    points = []
+    for i in range(n):
+        cx, cy = centres[rng.randrange(num_clusters)]
+        points.append({
+            'id': i + 1,
+            'x': min(max(int(rng.gauss(cx, spread)), 0), 100000),
+            'y': min(max(int(rng.gauss(cy, spread)), 0), 100000)
+        })
+    return points
+
+def average_node_visits(tree, queries): #average number of nodes RTree.query visits per query, the cache left out
+    visits = 0
+    for query in queries:
+        visits = visits + tree.count_visits(tree.root, query)
+    return visits / len(queries)
+
+class SpatialIndex(object): #interface shared by RTree, GridIndex, QuadTree and SequentialScan, so they can be swapped and benchmarked
+    @classmethod
+    def build(cls, points): #build an index over a list of data point dictionaries
+        index = cls()
+        for point in points:
+            index.add(point)
+        return index
+
+    def add(self, point): #add one data point dictionary
+        raise NotImplementedError
+
+    def count(self, query): #number of data points inside the query
+        raise NotImplementedError
+
+    def search(self, query, limit=None): #lazily yield the ids of the data points inside the query, stop after limit ids
+        raise NotImplementedError
+
+    def exists(self, query): #check whether any data point falls inside the query
+        for _ in self.search(query, limit=1):
+            return True
+        return False
+
 class Node(object): #node class
+    __slots__ = ('id', 'child_nodes', 'data_points', 'parent', 'MBR', 'count') # no per-instance __dict__, saves memory on large trees
+
     def __init__(self):
         self.id = 0
         # for internal nodes
@@ -112,6 +392,7 @@ class Node(object): #node class
         # for leaf nodes
         self.data_points = []
         self.parent = None
+        self.count = 0 # number of data points in the subtree, lets a query count a fully covered node without descending
         self.MBR = {
             'x1': -1,
             'y1': -1,
@@ -122,7 +403,10 @@ class Node(object): #node class
         # only calculate the half perimeter here
         return (self.MBR['x2'] - self.MBR['x1']) + (self.MBR['y2'] - self.MBR['y1'])
 
-    def is_overflow(self):
+    def area(self):
+        return (self.MBR['x2'] - self.MBR['x1']) * (self.MBR['y2'] - self.MBR['y1'])
+
+    def is_overflow(self, B=B):
         if self.is_leaf():
             if self.data_points.__len__() > B: #Checking overflows of data points, B is the upper bound.
                 return True
@@ -146,22 +430,374 @@ class Node(object): #node class
         else:
             return False
 
-class RTree(object): #R tree class
-    def __init__(self):
+class RTree(SpatialIndex): #R tree class
+    def __init__(self, B=B, min_fill=None, rstar=False, cache_size=0):
+        # B is the node capacity (the upper bound on entries per node), min_fill the lower bound used by split
+        # and condense_tree, 40% of B by default. cache_size is the number of query results kept, 0 for no cache
+        if min_fill is None:
+            min_fill = math.ceil(0.4 * B)
+        if B < 2 or not 1 <= min_fill <= (B + 1) // 2:
+            raise ValueError("need B >= 2 and 1 <= min_fill <= (B + 1) // 2, got B=" + str(B) + " min_fill=" + str(min_fill))
+        self.B = B
+        self.min_fill = min_fill
         self.root = Node() #Create a root
+        self.leaf_of = {} # side index from data point id to the leaf that holds it, for O(1) delete and update
+        # R*-tree mode: overlap-minimising choose_subtree above the leaves, R* split and forced reinsertion
+        self.rstar = rstar
+        self.reinserting = False # set while forced reinsertion is running, so it only happens on the first overflow
+        # LRU cache of query counts from the root, keyed on (x1, x2, y1, y2), least recently used first
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
 
-    def query(self, node, query): #run to answer the query
-        num = 0
-        if node.is_leaf(): #check if a data point is included in a leaf node
+    def set_cache_size(self, cache_size): #resize the query result cache, 0 turns it off, e.g. after a bulk load
+        self.cache_size = cache_size
+        while self.cache.__len__() > cache_size:
+            self.cache.popitem(last=False)
+
+    def cache_info(self): #hit and miss counters for sizing the cache
+        return {'hits': self.cache_hits, 'misses': self.cache_misses, 'size': self.cache.__len__(), 'max_size': self.cache_size}
+
+    def invalidate_cache(self, x, y): #drop only the cached results whose rectangle contains (x, y)
+        stale = [key for key in self.cache if key[0] <= x <= key[1] and key[2] <= y <= key[3]]
+        for key in stale:
+            del self.cache[key]
+
+    def height(self, node=None): #number of levels below and including node (the root by default), a lone leaf has height 1
+        levels = 1
+        if node is None:
+            node = self.root
+        while not node.is_leaf():
+            node = node.child_nodes[0]
+            levels = levels + 1
+        return levels
+
+    def node_count(self):
+        count = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.child_nodes)
+            count = count + 1
+        return count
+
+    @classmethod
+    def build(cls, points, **options): #SpatialIndex interface, builds with bulk_load
+        return cls.bulk_load(points, **options)
+
+    def add(self, point): #SpatialIndex interface
+        self.insert(self.root, point)
+
+    def count(self, query): #SpatialIndex interface
+        return self.query(self.root, query)
+
+    def pack(self): #return a read-only compact copy of the tree for fast querying
+        return PackedRTree(self)
+
+    def query_batch(self, queries): #answer many queries at once, see PackedRTree.query_batch
+        # the tree is packed on every call, pack it once and query the PackedRTree directly when running many batches
+        return self.pack().query_batch(queries)
+
+    def query_parallel(self, queries, workers=None): #answer many queries in worker processes, see PackedRTree.query_parallel
+        return self.pack().query_parallel(queries, workers)
+
+    def save(self, path): #write the tree to a file of fixed-size pages, see the layout next to PAGE_MAGIC
+        # lay the nodes out breadth first, node i goes to page i + 1
+        order = [self.root]
+        i = 0
+        while i < order.__len__():
+            order.extend(order[i].child_nodes)
+            i = i + 1
+        capacity = max(max(node.child_nodes.__len__(), node.data_points.__len__()) for node in order)
+        capacity = max(capacity, 1) # an empty tree still needs room for the file header in page 0
+        page_ints = NODE_HEADER_INTS + capacity * RECORD_INTS
+        with open(path, 'wb') as file:
+            header = array('i', [PAGE_BYTE_ORDER, page_ints * 4, capacity, order.__len__(), 1])
+            page = PAGE_MAGIC + header.tobytes()
+            file.write(page + bytes(page_ints * 4 - len(page)))
+            next_page = 2 # page of the first child of the next internal node, in breadth first order
+            for node in order:
+                page = array('i', bytes(page_ints * 4))
+                if node.is_leaf():
+                    page[0], page[1] = 1, node.data_points.__len__()
+                    for j, point in enumerate(node.data_points):
+                        base = NODE_HEADER_INTS + j * RECORD_INTS
+                        page[base], page[base + 1], page[base + 2] = point['id'], point['x'], point['y']
+                else:
+                    page[0], page[1] = 0, node.child_nodes.__len__()
+                    for j, child in enumerate(node.child_nodes):
+                        base = NODE_HEADER_INTS + j * RECORD_INTS
+                        page[base] = next_page
+                        page[base + 1], page[base + 2] = child.MBR['x1'], child.MBR['y1']
+                        page[base + 3], page[base + 4] = child.MBR['x2'], child.MBR['y2']
+                        page[base + 5] = child.count
+                        next_page = next_page + 1
+                file.write(page.tobytes())
+
+    @staticmethod
+    def open(path): #open a file written by save, queries are served from the memory-mapped pages
+        return MappedRTree(path)
+
+    @classmethod
+    def bulk_load(cls, points, B=B, min_fill=None, rstar=False): #build a fully packed tree with Sort-Tile-Recursive (STR) instead of inserting point by point
+        tree = cls(B=B, min_fill=min_fill, rstar=rstar)
+        points = list(points)
+        if points.__len__() == 0:
+            return tree
+        # leaf level: tile the points into leaves holding B points each
+        nodes = []
+        for group in tree.str_tiles(points, lambda point: point['x'], lambda point: point['y']):
+            nodes.append(tree.make_leaf(group))
+        tree.root = tree.build_upper_levels(nodes)
+        return tree
+
+    @classmethod
+    def bulk_load_arrays(cls, ids, xs, ys, B=B, min_fill=None, rstar=False): #STR bulk load from NumPy arrays of ids and coordinates
+        # gives the same tree as bulk_load on the equivalent point dictionaries, but the tiling is sorted with NumPy
+        # and data point dictionaries are only created one vertical slice at a time, while its leaves are built
+        if np is None:
+            raise ImportError("bulk_load_arrays requires NumPy")
+        tree = cls(B=B, min_fill=min_fill, rstar=rstar)
+        n = len(ids)
+        if n == 0:
+            return tree
+        slice_size = math.ceil(math.sqrt(math.ceil(n / tree.B))) * tree.B
+        by_x = np.argsort(xs, kind='stable')
+        x_rank = np.empty(n, dtype=np.int64)
+        x_rank[by_x] = np.arange(n)
+        # order by vertical slice, then y, then x order for ties, as the stable sorts in str_tiles do
+        order = np.lexsort((x_rank, ys, x_rank // slice_size))
+        nodes = []
+        for i in range(0, n, slice_size):
+            in_slice = order[i: i + slice_size]
+            slice_ids, slice_xs, slice_ys = ids[in_slice].tolist(), xs[in_slice].tolist(), ys[in_slice].tolist()
+            for j in range(0, in_slice.__len__(), tree.B):
+                nodes.append(tree.make_leaf([{'id': point_id, 'x': x, 'y': y} for point_id, x, y in
+                                             zip(slice_ids[j: j + tree.B], slice_xs[j: j + tree.B], slice_ys[j: j + tree.B])]))
+        tree.root = tree.build_upper_levels(nodes)
+        return tree
+
+    @classmethod
+    def from_file(cls, path, chunk_size=1000000, bulk=True, B=B, min_fill=None, rstar=False): #build a tree from an "id x y" file read in chunks
+        # bulk=True gathers the chunks into compact NumPy arrays and bulk loads them with bulk_load_arrays,
+        # bulk=False inserts each chunk as it arrives, so only one chunk of the file is in memory at a time
+        if bulk:
+            chunks = list(iter_point_chunks(path, chunk_size))
+            if chunks.__len__() == 0:
+                return cls(B=B, min_fill=min_fill, rstar=rstar)
+            return cls.bulk_load_arrays(np.concatenate([chunk[0] for chunk in chunks]),
+                                        np.concatenate([chunk[1] for chunk in chunks]),
+                                        np.concatenate([chunk[2] for chunk in chunks]), B=B, min_fill=min_fill, rstar=rstar)
+        tree = cls(B=B, min_fill=min_fill, rstar=rstar)
+        for ids, xs, ys in iter_point_chunks(path, chunk_size):
+            for point_id, x, y in zip(ids.tolist(), xs.tolist(), ys.tolist()):
+                tree.insert(tree.root, {'id': point_id, 'x': x, 'y': y})
+        return tree
+
+    def make_leaf(self, group): #leaf node holding the given data points, with its MBR and the leaf index set up
+        leaf = Node()
+        leaf.data_points = group
+        self.update_mbr(leaf)
+        for point in group:
+            self.leaf_of[point['id']] = leaf
+        return leaf
+
+    @classmethod
+    def bulk_load_parallel(cls, points, tiles=None, workers=None, B=B, min_fill=None, rstar=False): #bulk load one sub-tree per spatial tile in worker processes
+        # the points are cut into tiles with the same Sort-Tile-Recursive tiling used for leaves, every tile is bulk
+        # loaded in a ProcessPoolExecutor and the sub-trees are joined under a common root
+        tree = cls(B=B, min_fill=min_fill, rstar=rstar)
+        points = list(points)
+        if points.__len__() == 0:
+            return tree
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if tiles is None:
+            tiles = workers
+        groups = tree.str_tiles(points, lambda point: point['x'], lambda point: point['y'],
+                                math.ceil(points.__len__() / tiles))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            roots = list(executor.map(bulk_load_tile, groups, [tree.B] * groups.__len__(),
+                                      [tree.min_fill] * groups.__len__()))
+        # tiles of different sizes can give sub-trees one level apart, so bring every sub-tree down to the
+        # height of the shortest one and build the levels above it over all of them, keeping the tree balanced
+        heights = [tree.height(root) for root in roots]
+        nodes = []
+        for root, height in zip(roots, heights):
+            level = [root]
+            for _ in range(height - min(heights)):
+                level = [child for node in level for child in node.child_nodes]
+            nodes.extend(level)
+        for node in nodes:
+            node.parent = None
+        tree.root = tree.build_upper_levels(nodes)
+        # the leaves came back from the workers as copies, so index them here
+        stack = [tree.root]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.child_nodes)
             for point in node.data_points:
-                if self.is_covered(point, query):
-                    num = num + 1
-            return num
-        else:
-            for child in node.child_nodes: #If it is an MBR, check all the child nodes to see whether there is an interaction
-                if self.is_intersect(child, query): #If there is an interaction, keep continue to check the child nodes in the next layer till the leaf nodes
-                    num = num + self.query(child, query)
+                tree.leaf_of[point['id']] = node
+        return tree
+
+    def build_upper_levels(self, nodes): #tile the nodes of each level on their MBR centres until a single root is left
+        while nodes.__len__() > 1:
+            parents = []
+            for group in self.str_tiles(nodes, lambda node: node.MBR['x1'] + node.MBR['x2'],
+                                        lambda node: node.MBR['y1'] + node.MBR['y2']):
+                parent = Node()
+                for child in group:
+                    self.add_child(parent, child)
+                self.update_mbr(parent)
+                parents.append(parent)
+            nodes = parents
+        return nodes[0]
+
+    def str_tiles(self, entries, key_x, key_y, group_size=None): # split entries into groups of B (or group_size) with Sort-Tile-Recursive
+        # sort by x and cut into ceil(sqrt(P)) vertical slices, where P is the number of groups needed,
+        # then sort each slice by y and cut it into groups of B
+        if group_size is None:
+            group_size = self.B
+        n = entries.__len__()
+        num_groups = math.ceil(n / group_size)
+        slice_size = math.ceil(math.sqrt(num_groups)) * group_size
+        entries = sorted(entries, key=key_x)
+        groups = []
+        for i in range(0, n, slice_size):
+            vertical_slice = sorted(entries[i: i + slice_size], key=key_y)
+            for j in range(0, vertical_slice.__len__(), group_size):
+                groups.append(vertical_slice[j: j + group_size])
+        return groups
+
+    def query(self, node, query): #run to answer the query
+        if self.cache_size > 0 and node is self.root: #only whole-tree answers are cached
+            key = (query['x1'], query['x2'], query['y1'], query['y2'])
+            if key in self.cache:
+                self.cache_hits = self.cache_hits + 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.cache_misses = self.cache_misses + 1
+            num = self.query_nodes(node, query)
+            self.cache[key] = num
+            if self.cache.__len__() > self.cache_size:
+                self.cache.popitem(last=False)
             return num
+        return self.query_nodes(node, query)
+
+    def query_nodes(self, node, query): #count the points under node inside the query, without the cache
+        num = 0
+        stack = [node] #explicit stack instead of recursion, so deep trees cannot hit the recursion limit
+        while stack:
+            node = stack.pop()
+            if node.is_leaf(): #check if a data point is included in a leaf node
+                for point in node.data_points:
+                    if self.is_covered(point, query):
+                        num = num + 1
+            else:
+                for child in node.child_nodes: #If it is an MBR, check all the child nodes to see whether there is an interaction
+                    if self.is_inside(child, query): #every point under the child is covered, count them all without descending
+                        num = num + child.count
+                    elif self.is_intersect(child, query): #If there is an interaction, keep continue to check the child nodes in the next layer till the leaf nodes
+                        stack.append(child)
+        return num
+
+    def count_visits(self, node, query): #number of nodes query_nodes visits for the query, for benchmarking
+        # the same walk as query_nodes, kept apart so that counting costs nothing on the normal query path
+        visits = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            visits = visits + 1
+            for child in node.child_nodes:
+                if not self.is_inside(child, query) and self.is_intersect(child, query):
+                    stack.append(child)
+        return visits
+
+    def search(self, query, limit=None): #lazily yield the ids of the data points inside the query, stop after limit ids
+        if limit is not None and limit <= 0:
+            return
+        found = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.is_leaf():
+                for point in node.data_points:
+                    if self.is_covered(point, query):
+                        yield point['id']
+                        found = found + 1
+                        if found == limit: #the caller has enough hits, skip the rest of the tree
+                            return
+            else:
+                for child in node.child_nodes:
+                    if self.is_intersect(child, query):
+                        stack.append(child)
+
+    def nearest(self, x, y, k=1): #return the k data points closest to (x, y) as (distance, id) pairs, nearest first
+        # best-first search: a priority queue of nodes and data points keyed on their (squared) MINDIST to (x, y).
+        # a data point popped from the queue is closer than everything still queued, so it is the next neighbour
+        result = []
+        if k <= 0:
+            return result
+        counter = 0 # tie breaker so the heap never compares nodes or points
+        heap = [(0, counter, self.root, None)]
+        while heap and result.__len__() < k:
+            _, _, node, point = heapq.heappop(heap)
+            if point is not None:
+                result.append((math.hypot(point['x'] - x, point['y'] - y), point['id']))
+            elif node.is_leaf():
+                for point in node.data_points:
+                    counter = counter + 1
+                    heapq.heappush(heap, ((point['x'] - x) ** 2 + (point['y'] - y) ** 2, counter, None, point))
+            else:
+                for child in node.child_nodes:
+                    counter = counter + 1
+                    heapq.heappush(heap, (self.min_dist(child, x, y), counter, child, None))
+        return result
+
+    def min_dist(self, node, x, y): # squared distance from (x, y) to the closest point of the node's MBR, 0 if inside
+        dx = max(node.MBR['x1'] - x, 0, x - node.MBR['x2'])
+        dy = max(node.MBR['y1'] - y, 0, y - node.MBR['y2'])
+        return dx * dx + dy * dy
+
+    def spatial_join(self, rectangles): #yield (rectangle id, point id) for every data point inside every rectangle of a RectangleRTree
+        # both trees are walked together from their roots: a pair of nodes is only expanded when their MBRs intersect,
+        # so whole subtrees of points and of rectangles that are far apart are pruned in one step. before pairing up
+        # the children of two nodes, each side is first cut down to the children that reach the other node's MBR.
+        # once the rectangle side is down to a leaf, its rectangles are filtered one by one as the point side descends
+        stack = [(self.root, rectangles.root)]
+        while stack:
+            point_node, rectangle_node = stack.pop()
+            if not isinstance(rectangle_node, Node): #a list of rectangles left over from a rectangle leaf
+                candidates = rectangle_node
+            elif rectangle_node.is_leaf():
+                candidates = [rectangle for rectangle in rectangle_node.data_points if self.mbr_intersect(rectangle, point_node.MBR)]
+            else:
+                candidates = None
+            if candidates is not None:
+                if point_node.is_leaf():
+                    for rectangle in candidates:
+                        for point in point_node.data_points:
+                            if self.is_covered(point, rectangle):
+                                yield rectangle['id'], point['id']
+                else:
+                    for point_child in point_node.child_nodes:
+                        reached = [rectangle for rectangle in candidates if self.mbr_intersect(rectangle, point_child.MBR)]
+                        if reached:
+                            stack.append((point_child, reached))
+                continue
+            if point_node.is_leaf(): #only the rectangle side can go down a level
+                point_children = [point_node]
+            else:
+                point_children = [child for child in point_node.child_nodes if self.mbr_intersect(child.MBR, rectangle_node.MBR)]
+            rectangle_children = [child for child in rectangle_node.child_nodes if self.mbr_intersect(child.MBR, point_node.MBR)]
+            for point_child in point_children:
+                for rectangle_child in rectangle_children:
+                    if self.mbr_intersect(point_child.MBR, rectangle_child.MBR):
+                        stack.append((point_child, rectangle_child))
+
+    def mbr_intersect(self, mbr1, mbr2): #check if two MBRs (or queries) share at least one point
+        return mbr1['x1'] <= mbr2['x2'] and mbr2['x1'] <= mbr1['x2'] and mbr1['y1'] <= mbr2['y2'] and mbr2['y1'] <= mbr1['y2']
 
     def is_covered(self, point, query):
         x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
@@ -170,6 +806,10 @@ class RTree(object): #R tree class
         else:
             return False    
 
+    def is_inside(self, node, query): #check if the node's MBR lies entirely inside the query
+        return query['x1'] <= node.MBR['x1'] and node.MBR['x2'] <= query['x2'] and \
+            query['y1'] <= node.MBR['y1'] and node.MBR['y2'] <= query['y2']
+
     def is_intersect(self, node, query): #https://stackoverflow.com/questions/9734821/how-to-find-the-center-coordinate-of-rectangle
         # if two mbrs are intersected, then:
         # |center1_x - center2_x| <= length1 / 2 + length2 / 2 and:
@@ -190,27 +830,144 @@ class RTree(object): #R tree class
 
 
     def insert(self, u, p): # insert p(data point) to u (MBR)
-        if u.is_leaf(): 
-            self.add_data_point(u, p) #add the data point and update the corresponding MBR
-            if u.is_overflow():
+        if self.cache and not self.reinserting: #points moved by forced reinsertion are already counted
+            self.invalidate_cache(p['x'], p['y'])
+        path = [u] # u itself is included so that the point count of the root stays right
+        while not u.is_leaf():
+            u = self.choose_subtree(u, p) #choose a subtree to insert the data point to miminize the perimeter sum
+            path.append(u) #keep continue to check the next layer
+        self.add_data_point(u, p) #add the data point and update the corresponding MBR
+        if u.is_overflow(self.B):
+            if self.rstar and not self.reinserting and not u.is_root():
+                self.forced_reinsert(u) #R*-tree: reinsert some points before resorting to a split
+            else:
                 self.handle_overflow(u) #handel overflow for leaf nodes
+        for v in reversed(path): #update the MBRs and point counts on the way back up, deepest first
+            self.update_mbr(v)
+
+    def delete(self, point_id): #remove a data point by id, returns False if there is no such point
+        leaf = self.leaf_of.pop(point_id, None)
+        if leaf is None:
+            return False
+        for i, point in enumerate(leaf.data_points):
+            if point['id'] == point_id:
+                del leaf.data_points[i]
+                break
+        if self.cache:
+            self.invalidate_cache(point['x'], point['y'])
+        self.condense_tree(leaf)
+        return True
+
+    def update(self, point_id, x, y): #move a data point to (x, y), returns False if there is no such point
+        leaf = self.leaf_of.get(point_id)
+        if leaf is None:
+            return False
+        for i, point in enumerate(leaf.data_points):
+            if point['id'] == point_id:
+                break
+        moved = dict(point, x=x, y=y) # the caller's dict is left untouched
+        if not leaf.is_root() and leaf.MBR['x1'] <= x <= leaf.MBR['x2'] and leaf.MBR['y1'] <= y <= leaf.MBR['y2']:
+            leaf.data_points[i] = moved #still inside the leaf's MBR, so no MBR on the path changes
+            if self.cache:
+                self.invalidate_cache(point['x'], point['y'])
+                self.invalidate_cache(x, y)
+        else:
+            self.delete(point_id)
+            self.insert(self.root, moved)
+        return True
+
+    def condense_tree(self, u): #fix up the tree after removing a data point from leaf u
+        min_fill = self.min_fill #same lower bound as used by split
+        orphans = []
+        # walk up to the root, cutting out nodes that fell below the minimum fill and shrinking the MBRs of the rest
+        while not u.is_root():
+            w = u.parent
+            if max(u.data_points.__len__(), u.child_nodes.__len__()) < min_fill:
+                w.child_nodes.remove(u)
+                orphans.append(u)
+            else:
+                self.update_mbr(u)
+            u = w
+        # a root with a single child is replaced by that child
+        while not self.root.is_leaf() and self.root.child_nodes.__len__() == 1:
+            self.root = self.root.child_nodes[0]
+            self.root.parent = None
+        if self.root.child_nodes.__len__() == 0 and self.root.data_points.__len__() == 0:
+            self.root = Node() # the tree is empty, start again from a fresh root
         else:
-            v = self.choose_subtree(u, p) #choose a subtree to insert the data point to miminize the perimeter sum
-            self.insert(v, p) #keep continue to check the next layer recursively
-            self.update_mbr(v) #update the MBR for inserting the data point
+            self.update_mbr(self.root)
+        # reinsert the data points held under the cut out nodes
+        for orphan in orphans:
+            stack = [orphan]
+            while stack:
+                node = stack.pop()
+                stack.extend(node.child_nodes)
+                for point in node.data_points:
+                    self.insert(self.root, point)
+
+    def forced_reinsert(self, u): #R*-tree overflow treatment: take out the points farthest from u's centre and insert them again
+        centre_x = (u.MBR['x1'] + u.MBR['x2']) / 2
+        centre_y = (u.MBR['y1'] + u.MBR['y2']) / 2
+        by_distance = sorted(u.data_points, key=lambda point: (point['x'] - centre_x) ** 2 + (point['y'] - centre_y) ** 2)
+        p = math.ceil(0.3 * self.B) # the R*-tree paper suggests reinserting 30% of the entries
+        u.data_points = by_distance[:-p]
+        # u's MBR shrinks, so do the MBRs of its ancestors
+        v = u
+        while v is not None:
+            self.update_mbr(v)
+            v = v.parent
+        # closest first ("close reinsert"), further overflows during reinsertion are split as usual
+        self.reinserting = True
+        try:
+            for point in by_distance[-p:]:
+                self.insert(self.root, point)
+        finally:
+            self.reinserting = False
 
     def choose_subtree(self, u, p): 
         if u.is_leaf(): #find the leaf and insert the data point
             return u
+        elif self.rstar and u.child_nodes[0].is_leaf():
+            return self.choose_least_overlap(u, p) #R*-tree: minimise overlap when choosing between leaves
         else:
             min_increase = sys.maxsize #set an initial value
             best_child = None
             for child in u.child_nodes: #check each child to find the best node to insert the point 
-                if min_increase > self.peri_increase(child, p):
-                    min_increase = self.peri_increase(child, p)
+                increase = self.peri_increase(child, p)
+                if min_increase > increase:
+                    min_increase = increase
                     best_child = child
             return best_child
 
+    def choose_least_overlap(self, u, p): # pick the child whose overlap with its siblings grows least when it is enlarged to cover p
+        # ties are resolved by the least area enlargement, then by the smallest area
+        best = None
+        best_child = None
+        for child in u.child_nodes:
+            enlarged = {
+                'x1': min(child.MBR['x1'], p['x']),
+                'x2': max(child.MBR['x2'], p['x']),
+                'y1': min(child.MBR['y1'], p['y']),
+                'y2': max(child.MBR['y2'], p['y'])
+            }
+            overlap_increase = 0
+            for sibling in u.child_nodes:
+                if sibling is not child:
+                    overlap_increase = overlap_increase + self.overlap(enlarged, sibling.MBR) - self.overlap(child.MBR, sibling.MBR)
+            area = child.area()
+            area_increase = (enlarged['x2'] - enlarged['x1']) * (enlarged['y2'] - enlarged['y1']) - area
+            if best is None or (overlap_increase, area_increase, area) < best:
+                best = (overlap_increase, area_increase, area)
+                best_child = child
+        return best_child
+
+    def overlap(self, mbr1, mbr2): # area of the intersection of two MBRs
+        dx = min(mbr1['x2'], mbr2['x2']) - max(mbr1['x1'], mbr2['x1'])
+        dy = min(mbr1['y2'], mbr2['y2']) - max(mbr1['y1'], mbr2['y1'])
+        if dx <= 0 or dy <= 0:
+            return 0
+        return dx * dy
+
     def peri_increase(self, node, p): # calculate the increase of the perimeter after inserting the new data point
         # new perimeter - original perimeter = increase of perimeter
         origin_mbr = node.MBR
@@ -221,37 +978,43 @@ class RTree(object): #R tree class
 
 
     def handle_overflow(self, u):
-        u1, u2 = self.split(u) #u1 u2 are the two splits returned by the function "split"
-        # if u is root, create a new root with s1 and s2 as its' children
-        if u.is_root():
-            new_root = Node()
-            self.add_child(new_root, u1)
-            self.add_child(new_root, u2)
-            self.root = new_root
-            self.update_mbr(new_root)
-        # if u is not root, delete u, and set s1 and s2 as u's parent's new children
-        else:
+        while True:
+            u1, u2 = self.split(u) #u1 u2 are the two splits returned by the function "split"
+            # if u is root, create a new root with s1 and s2 as its' children
+            if u.is_root():
+                new_root = Node()
+                self.add_child(new_root, u1)
+                self.add_child(new_root, u2)
+                self.root = new_root
+                self.update_mbr(new_root)
+                return
+            # if u is not root, delete u, and set s1 and s2 as u's parent's new children
             w = u.parent
             # copy the information of s1 into u
             w.child_nodes.remove(u)
+            w.count = w.count - u.count
             self.add_child(w, u1) #link the two splits and update the corresponding MBR
             self.add_child(w, u2)
-            if w.is_overflow(): #check the parent node recursively
-                self.handle_overflow(w)
-            
+            if not w.is_overflow(self.B): #check the parent node, moving one level up each time
+                return
+            u = w
+
     def split(self, u):
         # split u into s1 and s2
         best_s1 = Node()
         best_s2 = Node()
         best_perimeter = sys.maxsize
+        # R*-tree split
+        if self.rstar:
+            best_s1, best_s2 = self.rstar_split(u)
         # u is a leaf node
-        if u.is_leaf():
+        elif u.is_leaf():
             m = u.data_points.__len__()
             # create two different kinds of divides
             divides = [sorted(u.data_points, key=lambda data_point: data_point['x']),
                        sorted(u.data_points, key=lambda data_point: data_point['y'])] #sorting the points based on X dimension and Y dimension
             for divide in divides:
-                for i in range(math.ceil(0.4 * B), m - math.ceil(0.4 * B) + 1): #check the combinations to find a near-optimal one
+                for i in range(self.min_fill, m - self.min_fill + 1): #check the combinations to find a near-optimal one
                     s1 = Node()
                     s1.data_points = divide[0: i]
                     self.update_mbr(s1)
@@ -272,7 +1035,7 @@ class RTree(object): #R tree class
                        sorted(u.child_nodes, key=lambda child_node: child_node.MBR['y1']),
                        sorted(u.child_nodes, key=lambda child_node: child_node.MBR['y2'])]
             for divide in divides:
-                for i in range(math.ceil(0.4 * B), m - math.ceil(0.4 * B) + 1): #check the combinations
+                for i in range(self.min_fill, m - self.min_fill + 1): #check the combinations
                     s1 = Node()
                     s1.child_nodes = divide[0: i]
                     self.update_mbr(s1)
@@ -288,13 +1051,53 @@ class RTree(object): #R tree class
             child.parent = best_s1
         for child in best_s2.child_nodes:
             child.parent = best_s2
+        for point in best_s1.data_points: #the data points of a split leaf move to the new leaves
+            self.leaf_of[point['id']] = best_s1
+        for point in best_s2.data_points:
+            self.leaf_of[point['id']] = best_s2
 
         return best_s1, best_s2
 
 
+    def rstar_split(self, u): # choose the axis with the smallest perimeter sum, then the split on it with the least overlap
+        m = max(u.data_points.__len__(), u.child_nodes.__len__())
+        if u.is_leaf():
+            axes = [[sorted(u.data_points, key=lambda data_point: data_point['x'])],
+                    [sorted(u.data_points, key=lambda data_point: data_point['y'])]]
+        else:
+            axes = [[sorted(u.child_nodes, key=lambda child_node: child_node.MBR['x1']),
+                     sorted(u.child_nodes, key=lambda child_node: child_node.MBR['x2'])],
+                    [sorted(u.child_nodes, key=lambda child_node: child_node.MBR['y1']),
+                     sorted(u.child_nodes, key=lambda child_node: child_node.MBR['y2'])]]
+        best_perimeter = None
+        best_candidates = None
+        for axis in axes:
+            perimeter = 0
+            candidates = []
+            for divide in axis:
+                for i in range(self.min_fill, m - self.min_fill + 1):
+                    s1 = Node()
+                    s2 = Node()
+                    if u.is_leaf():
+                        s1.data_points = divide[0: i]
+                        s2.data_points = divide[i: divide.__len__()]
+                    else:
+                        s1.child_nodes = divide[0: i]
+                        s2.child_nodes = divide[i: divide.__len__()]
+                    self.update_mbr(s1)
+                    self.update_mbr(s2)
+                    perimeter = perimeter + s1.perimeter() + s2.perimeter()
+                    candidates.append(((self.overlap(s1.MBR, s2.MBR), s1.area() + s2.area()), s1, s2))
+            if best_perimeter is None or perimeter < best_perimeter:
+                best_perimeter = perimeter
+                best_candidates = candidates
+        _, best_s1, best_s2 = min(best_candidates, key=lambda candidate: candidate[0])
+        return best_s1, best_s2
+
     def add_child(self, node, child):
         node.child_nodes.append(child) #add child nodes to the current parent (node) and update the MBRs. It is used in handeling overflows
         child.parent = node
+        node.count = node.count + child.count
         if child.MBR['x1'] < node.MBR['x1']:
             node.MBR['x1'] = child.MBR['x1']
         if child.MBR['x2'] > node.MBR['x2']:
@@ -307,6 +1110,8 @@ class RTree(object): #R tree class
 
     def add_data_point(self, node, data_point): #add data points and update the the MBRS
         node.data_points.append(data_point)
+        node.count = node.count + 1
+        self.leaf_of[data_point['id']] = node
         if data_point['x'] < node.MBR['x1']:
             node.MBR['x1'] = data_point['x']
         if data_point['x'] > node.MBR['x2']:
@@ -317,15 +1122,17 @@ class RTree(object): #R tree class
             node.MBR['y2'] = data_point['y']
 
 
-    def update_mbr(self, node): #update MBRs when forming a new MBR. It is used in checking the combinations and update the root
+    def update_mbr(self, node): #update MBRs (and point counts) when forming a new MBR. It is used in checking the combinations and update the root
         x_list = []
         y_list = []
         if node.is_leaf():
             x_list = [point['x'] for point in node.data_points]
             y_list = [point['y'] for point in node.data_points]
+            node.count = node.data_points.__len__()
         else:
             x_list = [child.MBR['x1'] for child in node.child_nodes] + [child.MBR['x2'] for child in node.child_nodes]
             y_list = [child.MBR['y1'] for child in node.child_nodes] + [child.MBR['y2'] for child in node.child_nodes]
+            node.count = sum(child.count for child in node.child_nodes)
         new_mbr = {
             'x1': min(x_list),
             'x2': max(x_list),
@@ -334,5 +1141,539 @@ class RTree(object): #R tree class
         }
         node.MBR = new_mbr    
 
+class RectangleRTree(object): #read-only R tree whose leaves hold rectangles {'id', 'x1', 'x2', 'y1', 'y2'}, laid out like a query
+    # it is the rectangle side of RTree.spatial_join and is built with bulk_load only. it is not an RTree: the point
+    # methods (insert, delete, nearest, pack, save, ...) read 'x' and 'y' from the leaves and have no meaning here.
+    # the STR helpers only touch node MBRs, counts and self.B, so they are shared with RTree as they are
+    str_tiles = RTree.str_tiles
+    build_upper_levels = RTree.build_upper_levels
+    add_child = RTree.add_child
+
+    def __init__(self, B=B):
+        if B < 2:
+            raise ValueError("need B >= 2, got B=" + str(B))
+        self.B = B
+        self.root = Node()
+
+    @classmethod
+    def bulk_load(cls, rectangles, B=B): #STR bulk load on the rectangle centres
+        tree = cls(B=B)
+        rectangles = list(rectangles)
+        if rectangles.__len__() == 0:
+            return tree
+        nodes = []
+        for group in tree.str_tiles(rectangles, lambda rectangle: rectangle['x1'] + rectangle['x2'],
+                                    lambda rectangle: rectangle['y1'] + rectangle['y2']):
+            leaf = Node()
+            leaf.data_points = group
+            tree.update_mbr(leaf)
+            nodes.append(leaf)
+        tree.root = tree.build_upper_levels(nodes)
+        return tree
+
+    def update_mbr(self, node): #a leaf's MBR covers the whole extent of its rectangles
+        if node.is_leaf():
+            node.MBR = {
+                'x1': min(rectangle['x1'] for rectangle in node.data_points),
+                'x2': max(rectangle['x2'] for rectangle in node.data_points),
+                'y1': min(rectangle['y1'] for rectangle in node.data_points),
+                'y2': max(rectangle['y2'] for rectangle in node.data_points)
+            }
+            node.count = node.data_points.__len__()
+        else:
+            RTree.update_mbr(self, node)
+
+class PackedRTree(object): #read-only R tree with node MBRs and leaf points kept in contiguous typed arrays
+    def __init__(self, rtree):
+        self.root = 0 # nodes are addressed by their index in the arrays, the root is always node 0
+        # one entry per node
+        self.mbr_x1 = array('i')
+        self.mbr_y1 = array('i')
+        self.mbr_x2 = array('i')
+        self.mbr_y2 = array('i')
+        self.leaf = array('b')
+        self.first = array('i') # index of the first child node (internal nodes) or the first data point (leaf nodes)
+        self.count = array('i') # number of child nodes or data points
+        self.subtree_count = array('i') # number of data points in the subtree
+        # one entry per data point, the points of a leaf are stored next to each other
+        self.point_id = array('i')
+        self.point_x = array('i')
+        self.point_y = array('i')
+
+        # lay the nodes out breadth first so that the children of every node are contiguous
+        order = [rtree.root]
+        i = 0
+        while i < order.__len__():
+            node = order[i]
+            i = i + 1
+            self.mbr_x1.append(node.MBR['x1'])
+            self.mbr_y1.append(node.MBR['y1'])
+            self.mbr_x2.append(node.MBR['x2'])
+            self.mbr_y2.append(node.MBR['y2'])
+            self.subtree_count.append(node.count)
+            if node.is_leaf():
+                self.leaf.append(1)
+                self.first.append(self.point_id.__len__())
+                self.count.append(node.data_points.__len__())
+                for point in node.data_points:
+                    self.point_id.append(point['id'])
+                    self.point_x.append(point['x'])
+                    self.point_y.append(point['y'])
+            else:
+                self.leaf.append(0)
+                self.first.append(order.__len__())
+                self.count.append(node.child_nodes.__len__())
+                order.extend(node.child_nodes)
+
+    def query(self, node, query): #same answer as RTree.query, node is a node index
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        leaf, first, count, subtree_count = self.leaf, self.first, self.count, self.subtree_count
+        mbr_x1, mbr_y1, mbr_x2, mbr_y2 = self.mbr_x1, self.mbr_y1, self.mbr_x2, self.mbr_y2
+        point_x, point_y = self.point_x, self.point_y
+        num = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            start = first[node]
+            end = start + count[node]
+            if leaf[node]: #count the data points of the leaf that fall inside the query
+                for i in range(start, end):
+                    if x1 <= point_x[i] <= x2 and y1 <= point_y[i] <= y2:
+                        num = num + 1
+            else:
+                for child in range(start, end):
+                    if x1 <= mbr_x1[child] and mbr_x2[child] <= x2 and y1 <= mbr_y1[child] and mbr_y2[child] <= y2:
+                        num = num + subtree_count[child] #child lies inside the query, take its whole count
+                    elif mbr_x1[child] <= x2 and x1 <= mbr_x2[child] and mbr_y1[child] <= y2 and y1 <= mbr_y2[child]:
+                        stack.append(child)
+        return num
+
+    def search(self, query, limit=None): #lazily yield the ids of the data points inside the query, stop after limit ids
+        if limit is not None and limit <= 0:
+            return
+        point_id = self.point_id
+        found = 0
+        for i in self.scan(self.root, query):
+            yield point_id[i]
+            found = found + 1
+            if found == limit:
+                return
+
+    def exists(self, query): #check whether any data point falls inside the query
+        for _ in self.scan(self.root, query):
+            return True
+        return False
+
+    def scan(self, node, query): #yield the array index of every data point under node that falls inside the query
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        leaf, first, count = self.leaf, self.first, self.count
+        mbr_x1, mbr_y1, mbr_x2, mbr_y2 = self.mbr_x1, self.mbr_y1, self.mbr_x2, self.mbr_y2
+        point_x, point_y = self.point_x, self.point_y
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            start = first[node]
+            end = start + count[node]
+            if leaf[node]: #check the data points of the leaf
+                for i in range(start, end):
+                    if x1 <= point_x[i] <= x2 and y1 <= point_y[i] <= y2:
+                        yield i
+            else: #descend into every child whose MBR intersects the query
+                for child in range(start, end):
+                    if mbr_x1[child] <= x2 and x1 <= mbr_x2[child] and mbr_y1[child] <= y2 and y1 <= mbr_y2[child]:
+                        stack.append(child)
+
+    def query_batch(self, queries): #count the points in each row of an (m, 4) array of [x1, x2, y1, y2] query rectangles
+        if np is None:
+            raise ImportError("query_batch requires NumPy")
+        queries = np.asarray(queries).reshape(-1, 4)
+        m = queries.shape[0]
+        q_x1, q_x2, q_y1, q_y2 = queries[:, 0], queries[:, 1], queries[:, 2], queries[:, 3]
+        # zero-copy NumPy views of the arrays
+        mbr_x1, mbr_y1 = np.frombuffer(self.mbr_x1, dtype=np.intc), np.frombuffer(self.mbr_y1, dtype=np.intc)
+        mbr_x2, mbr_y2 = np.frombuffer(self.mbr_x2, dtype=np.intc), np.frombuffer(self.mbr_y2, dtype=np.intc)
+        leaf = np.frombuffer(self.leaf, dtype=np.int8).astype(bool)
+        first, count = np.frombuffer(self.first, dtype=np.intc), np.frombuffer(self.count, dtype=np.intc)
+        subtree_count = np.frombuffer(self.subtree_count, dtype=np.intc)
+        point_x, point_y = np.frombuffer(self.point_x, dtype=np.intc), np.frombuffer(self.point_y, dtype=np.intc)
+
+        results = np.zeros(m, dtype=np.int64)
+        # every live (node, query) pair of the current level, all queries start at the root
+        nodes = np.zeros(m, dtype=np.intp)
+        live = np.arange(m)
+        while nodes.size > 0:
+            is_leaf = leaf[nodes]
+            # leaf pairs: test all points of the leaf against the query and add up the hits per query
+            if is_leaf.any():
+                points, owners = self.expand(first, count, nodes[is_leaf], live[is_leaf])
+                hits = (q_x1[owners] <= point_x[points]) & (point_x[points] <= q_x2[owners]) & \
+                       (q_y1[owners] <= point_y[points]) & (point_y[points] <= q_y2[owners])
+                results += np.bincount(owners[hits], minlength=m)
+            # internal pairs: children inside their query add their whole point count, the (child, query) pairs
+            # whose MBRs only intersect go on to the next level
+            children, owners = self.expand(first, count, nodes[~is_leaf], live[~is_leaf])
+            inside = (q_x1[owners] <= mbr_x1[children]) & (mbr_x2[children] <= q_x2[owners]) & \
+                     (q_y1[owners] <= mbr_y1[children]) & (mbr_y2[children] <= q_y2[owners])
+            results += np.bincount(owners[inside], weights=subtree_count[children[inside]], minlength=m).astype(np.int64)
+            intersect = (mbr_x1[children] <= q_x2[owners]) & (q_x1[owners] <= mbr_x2[children]) & \
+                        (mbr_y1[children] <= q_y2[owners]) & (q_y1[owners] <= mbr_y2[children]) & ~inside
+            nodes, live = children[intersect], owners[intersect]
+        return results
+
+    def expand(self, first, count, nodes, owners): #list the entries (children or points) of each node, paired with the query that reached it
+        counts = count[nodes]
+        total = int(counts.sum())
+        # offset of each entry within its node: 0, 1, ..., count - 1 for every node
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(first[nodes], counts) + offsets, np.repeat(owners, counts)
+
+    def query_parallel(self, queries, workers=None): #split rows of [x1, x2, y1, y2] query rectangles across worker processes
+        # every worker receives one copy of the arrays when the pool starts, then answers a contiguous chunk of
+        # the queries. starting the pool costs far more than a query, so this only pays off for large batches
+        if workers is None:
+            workers = os.cpu_count() or 1
+        chunk_size = max(1, math.ceil(len(queries) / workers))
+        chunks = [queries[i: i + chunk_size] for i in range(0, len(queries), chunk_size)]
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_query_worker, initargs=(self,)) as executor:
+            for counts in executor.map(query_chunk, chunks):
+                results.extend(counts)
+        return results
+
+    def nbytes(self): #memory used by the arrays
+        return sum(a.itemsize * a.__len__() for a in (self.mbr_x1, self.mbr_y1, self.mbr_x2, self.mbr_y2, self.leaf,
+                                                    self.first, self.count, self.subtree_count, self.point_id,
+                                                    self.point_x, self.point_y))
+
+# process pool workers, these live at module level so that they can be pickled
+def bulk_load_tile(points, B, min_fill): #bulk load the points of one tile and return the root of its sub-tree
+    return RTree.bulk_load(points, B=B, min_fill=min_fill).root
+
+worker_tree = None # the PackedRTree a query worker answers queries against
+
+def init_query_worker(packed):
+    global worker_tree
+    worker_tree = packed
+
+def query_chunk(queries): #count the points in each [x1, x2, y1, y2] row using the worker's tree
+    if np is not None:
+        return worker_tree.query_batch(queries).tolist()
+    return [worker_tree.query(worker_tree.root, {'x1': x1, 'x2': x2, 'y1': y1, 'y2': y2}) for x1, x2, y1, y2 in queries]
+
+class MappedRTree(object): #read-only R tree answering queries directly from the pages of a file written by RTree.save
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(PAGE_MAGIC)] != PAGE_MAGIC:
+            self.close()
+            raise ValueError(path + " is not a saved R-Tree")
+        self.ints = memoryview(self.map).cast('i') # the whole file as int32 values, nothing is copied
+        header = len(PAGE_MAGIC) // 4
+        if self.ints[header] != PAGE_BYTE_ORDER:
+            self.close()
+            raise ValueError(path + " was saved on a machine with a different byte order")
+        self.page_ints = self.ints[header + 1] // 4
+        self.capacity = self.ints[header + 2]
+        self.node_count = self.ints[header + 3]
+        self.root = self.ints[header + 4] # nodes are addressed by page number
+
+    def close(self):
+        if getattr(self, 'ints', None) is not None:
+            self.ints.release()
+            self.ints = None
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def query(self, node, query): #same answer as RTree.query, node is a page number
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        ints = self.ints
+        page_ints = self.page_ints
+        num = 0
+        stack = [node]
+        while stack:
+            base = stack.pop() * page_ints
+            start = base + NODE_HEADER_INTS
+            end = start + ints[base + 1] * RECORD_INTS
+            if ints[base]: #leaf page
+                for i in range(start, end, RECORD_INTS):
+                    if x1 <= ints[i + 1] <= x2 and y1 <= ints[i + 2] <= y2:
+                        num = num + 1
+            else: #internal page, children inside the query add their whole point count
+                for i in range(start, end, RECORD_INTS):
+                    if x1 <= ints[i + 1] and ints[i + 3] <= x2 and y1 <= ints[i + 2] and ints[i + 4] <= y2:
+                        num = num + ints[i + 5]
+                    elif ints[i + 1] <= x2 and x1 <= ints[i + 3] and ints[i + 2] <= y2 and y1 <= ints[i + 4]:
+                        stack.append(ints[i])
+        return num
+
+    def search(self, query, limit=None): #lazily yield the ids of the data points inside the query, stop after limit ids
+        if limit is not None and limit <= 0:
+            return
+        found = 0
+        for point_id in self.scan(self.root, query):
+            yield point_id
+            found = found + 1
+            if found == limit:
+                return
+
+    def exists(self, query): #check whether any data point falls inside the query
+        for _ in self.scan(self.root, query):
+            return True
+        return False
+
+    def scan(self, node, query): #yield the id of every data point under node that falls inside the query
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        ints = self.ints
+        page_ints = self.page_ints
+        stack = [node]
+        while stack:
+            base = stack.pop() * page_ints
+            start = base + NODE_HEADER_INTS
+            end = start + ints[base + 1] * RECORD_INTS
+            if ints[base]: #leaf page, records are [id, x, y, 0, 0, 0]
+                for i in range(start, end, RECORD_INTS):
+                    if x1 <= ints[i + 1] <= x2 and y1 <= ints[i + 2] <= y2:
+                        yield ints[i]
+            else: #internal page, records are [child page, x1, y1, x2, y2, points under child]
+                for i in range(start, end, RECORD_INTS):
+                    if ints[i + 1] <= x2 and x1 <= ints[i + 3] and ints[i + 2] <= y2 and y1 <= ints[i + 4]:
+                        stack.append(ints[i])
+
+class SequentialScan(SpatialIndex): #no index at all, every query checks every data point
+    def __init__(self):
+        self.points = []
+
+    def add(self, point):
+        self.points.append(point)
+
+    def count(self, query):
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        num = 0
+        for point in self.points:
+            if x1 <= point['x'] <= x2 and y1 <= point['y'] <= y2:
+                num = num + 1
+        return num
+
+    def search(self, query, limit=None):
+        if limit is not None and limit <= 0:
+            return
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        found = 0
+        for point in self.points:
+            if x1 <= point['x'] <= x2 and y1 <= point['y'] <= y2:
+                yield point['id']
+                found = found + 1
+                if found == limit:
+                    return
+
+class GridIndex(SpatialIndex): #uniform grid of square cells, each cell keeps a list of the data points that fall in it
+    def __init__(self, x1=0, y1=0, x2=100000, y2=100000, cell_size=1000):
+        self.x1 = x1
+        self.y1 = y1
+        self.cell_size = cell_size
+        self.columns = int((x2 - x1) // cell_size) + 1
+        self.rows = int((y2 - y1) // cell_size) + 1
+        self.cells = [[] for _ in range(self.columns * self.rows)] # row by row, cell (column, row) is at row * columns + column
+
+    @classmethod
+    def build(cls, points, points_per_cell=4): #size the cells over the data's extent so that they hold points_per_cell points on average
+        points = list(points)
+        if points.__len__() == 0:
+            return cls()
+        x1, x2 = min(point['x'] for point in points), max(point['x'] for point in points)
+        y1, y2 = min(point['y'] for point in points), max(point['y'] for point in points)
+        cell_size = max(1, math.sqrt(max(x2 - x1, 1) * max(y2 - y1, 1) * points_per_cell / points.__len__()))
+        grid = cls(x1, y1, x2, y2, cell_size)
+        for point in points:
+            grid.add(point)
+        return grid
+
+    def cell_of(self, x, y): #column and row of the cell holding (x, y), points outside the grid go to the nearest edge cell
+        column = min(max(int((x - self.x1) // self.cell_size), 0), self.columns - 1)
+        row = min(max(int((y - self.y1) // self.cell_size), 0), self.rows - 1)
+        return column, row
+
+    def add(self, point):
+        column, row = self.cell_of(point['x'], point['y'])
+        self.cells[row * self.columns + column].append(point)
+
+    def cells_in(self, query): #yield (cell, inside) for every cell the query touches, inside means no point needs checking
+        if query['x1'] > query['x2'] or query['y1'] > query['y2']:
+            return
+        first_column, first_row = self.cell_of(query['x1'], query['y1'])
+        last_column, last_row = self.cell_of(query['x2'], query['y2'])
+        for row in range(first_row, last_row + 1):
+            cell_y1 = self.y1 + row * self.cell_size
+            # edge cells can hold points from outside the grid, so they are always checked point by point
+            row_inside = 0 < row < self.rows - 1 and query['y1'] <= cell_y1 and cell_y1 + self.cell_size <= query['y2']
+            for column in range(first_column, last_column + 1):
+                cell_x1 = self.x1 + column * self.cell_size
+                inside = row_inside and 0 < column < self.columns - 1 and \
+                    query['x1'] <= cell_x1 and cell_x1 + self.cell_size <= query['x2']
+                yield self.cells[row * self.columns + column], inside
+
+    def count(self, query):
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        num = 0
+        for cell, inside in self.cells_in(query):
+            if inside:
+                num = num + cell.__len__()
+            else:
+                for point in cell:
+                    if x1 <= point['x'] <= x2 and y1 <= point['y'] <= y2:
+                        num = num + 1
+        return num
+
+    def search(self, query, limit=None):
+        if limit is not None and limit <= 0:
+            return
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        found = 0
+        for cell, inside in self.cells_in(query):
+            for point in cell:
+                if inside or (x1 <= point['x'] <= x2 and y1 <= point['y'] <= y2):
+                    yield point['id']
+                    found = found + 1
+                    if found == limit:
+                        return
+
+class QuadNode(object): #region of a QuadTree, either a leaf bucket of points or split into four quadrants at (mx, my)
+    __slots__ = ('x1', 'y1', 'x2', 'y2', 'mx', 'my', 'points', 'children', 'count')
+
+    def __init__(self, x1, y1, x2, y2):
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+        self.mx = self.my = None
+        self.points = []
+        self.children = [] # south-west, south-east, north-west, north-east once split
+        self.count = 0 # number of data points in the region
+
+class QuadTree(SpatialIndex): #point-region (PR) quadtree, a region splits into four equal quadrants once it holds more than capacity points
+    def __init__(self, x1=0, y1=0, x2=100000, y2=100000, capacity=8, max_depth=32):
+        self.root = QuadNode(x1, y1, x2, y2)
+        self.capacity = capacity
+        self.max_depth = max_depth # stops splitting when many points share the same coordinates
+
+    @classmethod
+    def build(cls, points, capacity=8): #cover the data's extent with the root region and add the points one by one
+        points = list(points)
+        if points.__len__() == 0:
+            return cls(capacity=capacity)
+        tree = cls(min(point['x'] for point in points), min(point['y'] for point in points),
+                   max(point['x'] for point in points), max(point['y'] for point in points), capacity)
+        for point in points:
+            tree.add(point)
+        return tree
+
+    def add(self, point):
+        x, y = point['x'], point['y']
+        while not (self.root.x1 <= x <= self.root.x2 and self.root.y1 <= y <= self.root.y2):
+            self.grow(x, y)
+        node = self.root
+        depth = 0
+        while node.children:
+            node.count = node.count + 1
+            node = node.children[(x >= node.mx) + 2 * (y >= node.my)]
+            depth = depth + 1
+        node.count = node.count + 1
+        node.points.append(point)
+        if node.points.__len__() > self.capacity and depth < self.max_depth:
+            self.split(node)
+
+    def split(self, node): #turn a full leaf into four quadrants and move its points down, splitting again if they all land together
+        while True:
+            node.mx = (node.x1 + node.x2) / 2
+            node.my = (node.y1 + node.y2) / 2
+            self.make_quadrants(node)
+            for point in node.points:
+                child = node.children[(point['x'] >= node.mx) + 2 * (point['y'] >= node.my)]
+                child.points.append(point)
+                child.count = child.count + 1
+            node.points = []
+            full = [child for child in node.children if child.points.__len__() > self.capacity]
+            if not full or self.depth(full[0]) >= self.max_depth:
+                return
+            node = full[0]
+
+    def make_quadrants(self, node):
+        node.children = [QuadNode(node.x1, node.y1, node.mx, node.my), QuadNode(node.mx, node.y1, node.x2, node.my),
+                         QuadNode(node.x1, node.my, node.mx, node.y2), QuadNode(node.mx, node.my, node.x2, node.y2)]
+
+    def depth(self, target): #depth of a node, found by walking down from the root towards it
+        node = self.root
+        depth = 0
+        while node is not target:
+            node = node.children[(target.x1 >= node.mx) + 2 * (target.y1 >= node.my)]
+            depth = depth + 1
+        return depth
+
+    def grow(self, x, y): #double the root region towards (x, y), the old root becomes one of the new quadrants
+        old = self.root
+        width = max(old.x2 - old.x1, 1)
+        height = max(old.y2 - old.y1, 1)
+        if x < old.x1:
+            new = QuadNode(old.x1 - width, 0, old.x1 + width, 0)
+            new.mx = old.x1
+        else:
+            new = QuadNode(old.x1, 0, old.x1 + 2 * width, 0)
+            new.mx = old.x1 + width
+        if y < old.y1:
+            new.y1, new.y2 = old.y1 - height, old.y1 + height
+            new.my = old.y1
+        else:
+            new.y1, new.y2 = old.y1, old.y1 + 2 * height
+            new.my = old.y1 + height
+        self.make_quadrants(new)
+        # the quadrant sitting exactly on the old region takes over the old root's contents
+        quadrant = (old.x1 >= new.mx) + 2 * (old.y1 >= new.my)
+        old.x2 = new.children[quadrant].x2
+        old.y2 = new.children[quadrant].y2
+        new.children[quadrant] = old
+        new.count = old.count
+        self.root = new
+
+    def count(self, query):
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        num = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.count == 0 or node.x2 < x1 or x2 < node.x1 or node.y2 < y1 or y2 < node.y1:
+                continue
+            if x1 <= node.x1 and node.x2 <= x2 and y1 <= node.y1 and node.y2 <= y2:
+                num = num + node.count #region inside the query
+            elif node.children:
+                stack.extend(node.children)
+            else:
+                for point in node.points:
+                    if x1 <= point['x'] <= x2 and y1 <= point['y'] <= y2:
+                        num = num + 1
+        return num
+
+    def search(self, query, limit=None):
+        if limit is not None and limit <= 0:
+            return
+        x1, x2, y1, y2 = query['x1'], query['x2'], query['y1'], query['y2']
+        found = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.count == 0 or node.x2 < x1 or x2 < node.x1 or node.y2 < y1 or y2 < node.y1:
+                continue
+            if node.children:
+                stack.extend(node.children)
+                continue
+            for point in node.points:
+                if x1 <= point['x'] <= x2 and y1 <= point['y'] <= y2:
+                    yield point['id']
+                    found = found + 1
+                    if found == limit:
+                        return
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import time as t
+from datetime import datetime
+
+from RTree import (GridIndex, QuadTree, RTree, SequentialScan, clustered_points, np, read_points, read_queries,
+                   skewed_points, uniform_points)
+
+# benchmark harness for the R-Tree: builds every index type over each dataset, times each query individually with
+# perf_counter_ns after a warmup, and writes the latency percentiles and build throughput to a JSON file that can be
+# compared between commits
+
+# the other SpatialIndex implementations, benchmarked through the common build/count interface
+INDEXES = {
+    'grid': GridIndex,
+    'quadtree': QuadTree,
+    'scan': SequentialScan
+}
+
+DATASETS = {
+    'uniform': uniform_points,
+    'clustered': clustered_points,
+    'skewed': skewed_points
+}
+
+def random_queries(points, m, side, seed=0): #m square query rectangles of the given side, centred on random data points
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(m):
+        point = points[rng.randrange(len(points))]
+        queries.append({
+            'x1': point['x'] - side // 2,
+            'x2': point['x'] + side // 2,
+            'y1': point['y'] - side // 2,
+            'y2': point['y'] + side // 2
+        })
+    return queries
+
+def percentile(sorted_values, p): #linear interpolation between the closest ranks
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def latency_summary(latencies_ns): #percentiles in microseconds plus throughput for a list of per-query timings
+    latencies = sorted(latencies_ns)
+    return {
+        'runs': len(latencies),
+        'mean_us': sum(latencies) / len(latencies) / 1000,
+        'p50_us': percentile(latencies, 50) / 1000,
+        'p95_us': percentile(latencies, 95) / 1000,
+        'p99_us': percentile(latencies, 99) / 1000,
+        'max_us': latencies[-1] / 1000,
+        'queries_per_second': len(latencies) / (sum(latencies) / 1e9) if sum(latencies) > 0 else None
+    }
+
+def time_build(build, points, repeats): #median build time over several runs, returns the last tree built
+    times = []
+    tree = None
+    for _ in range(repeats):
+        start = t.perf_counter_ns()
+        tree = build(points)
+        times.append(t.perf_counter_ns() - start)
+    seconds = sorted(times)[len(times) // 2] / 1e9
+    return tree, {
+        'runs': repeats,
+        'seconds': seconds,
+        'points_per_second': len(points) / seconds if seconds > 0 else None
+    }
+
+def build_by_insert(points):
+    rtree = RTree()
+    for point in points:
+        rtree.insert(rtree.root, point)
+    return rtree
+
+def time_queries(run_query, queries, warmup, repeats): #per-query latencies over repeated runs, after warmup runs
+    for _ in range(warmup):
+        for query in queries:
+            run_query(query)
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start = t.perf_counter_ns()
+            run_query(query)
+            latencies.append(t.perf_counter_ns() - start)
+    return latency_summary(latencies)
+
+def time_batch(packed, queries, warmup, repeats): #time whole query_batch calls over all queries
+    # a batch is timed as one call, so there are no per-query latencies to take percentiles of: this reports the
+    # time per call over the repeats, and that time spread over the queries of the batch
+    query_array = np.array([[query['x1'], query['x2'], query['y1'], query['y2']] for query in queries])
+    for _ in range(warmup):
+        packed.query_batch(query_array)
+    totals = []
+    for _ in range(repeats):
+        start = t.perf_counter_ns()
+        packed.query_batch(query_array)
+        totals.append(t.perf_counter_ns() - start)
+    totals = sorted(totals)
+    return {
+        'runs': repeats,
+        'queries_per_batch': len(queries),
+        'per_batch_ms': {
+            'mean': sum(totals) / len(totals) / 1e6,
+            'min': totals[0] / 1e6,
+            'median': percentile(totals, 50) / 1e6,
+            'max': totals[-1] / 1e6
+        },
+        'amortised_us_per_query': percentile(totals, 50) / len(queries) / 1000,
+        'queries_per_second': len(queries) * len(totals) / (sum(totals) / 1e9) if sum(totals) > 0 else None
+    }
+
+def run_benchmark(name, points, queries, args):
+    print("benchmarking", name, "with", len(points), "points and", len(queries), "queries")
+    result = {'dataset': name, 'points': len(points), 'queries': len(queries), 'build': {}, 'query': {}}
+
+    rtree, result['build']['bulk_load'] = time_build(RTree.bulk_load, points, args.build_repeats)
+    if len(points) <= args.max_insert_points:
+        inserted, result['build']['insert'] = time_build(build_by_insert, points, args.build_repeats)
+        result['query']['insert_rtree'] = time_queries(lambda query: inserted.query(inserted.root, query),
+                                                       queries, args.warmup, args.repeats)
+    packed = rtree.pack()
+
+    result['query']['rtree'] = time_queries(lambda query: rtree.query(rtree.root, query), queries, args.warmup, args.repeats)
+    result['query']['packed'] = time_queries(lambda query: packed.query(packed.root, query), queries, args.warmup, args.repeats)
+    if np is not None:
+        result['batch'] = time_batch(packed, queries, args.warmup, args.repeats)
+
+    for index_name, index_type in INDEXES.items():
+        if index_type is SequentialScan and len(points) > args.max_scan_points:
+            continue
+        index, result['build'][index_name] = time_build(index_type.build, points, args.build_repeats)
+        result['query'][index_name] = time_queries(index.count, queries, args.warmup, args.repeats)
+
+    for method, build in result['build'].items():
+        print("  build {:<12} {:>10.3f} s {:>14,.0f} points/s".format(method, build['seconds'], build['points_per_second'] or 0))
+    for method, query in result['query'].items():
+        print("  query {:<12} p50 {:>9.1f} us  p95 {:>9.1f} us  p99 {:>9.1f} us".format(
+            method, query['p50_us'], query['p95_us'], query['p99_us']))
+    if 'batch' in result:
+        print("  batch {:<12} {:>9.3f} ms per batch of {} queries, {:.2f} us per query amortised".format(
+            'query_batch', result['batch']['per_batch_ms']['median'], result['batch']['queries_per_batch'],
+            result['batch']['amortised_us_per_query']))
+    return result
+
+def git_commit(): #commit the benchmark ran against, so results files can be lined up with the history
+    # asked of the repository holding this script, wherever the benchmark is started from
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark R-Tree builds and range queries and write the results as JSON')
+    parser.add_argument('--datasets', default='file,uniform,clustered,skewed',
+                        help='comma separated: file (the --dataset file with the --queries file), uniform, clustered, skewed')
+    parser.add_argument('--sizes', default='10000,100000', help='comma separated point counts for the synthetic datasets')
+    parser.add_argument('--dataset', default='dataset.txt', help='data points, one "id x y" per line')
+    parser.add_argument('--queries', default='test_query.txt', help='query rectangles, one "x1 x2 y1 y2" per line')
+    parser.add_argument('--num-queries', type=int, default=1000, help='queries generated for each synthetic dataset')
+    parser.add_argument('--query-side', type=int, default=1000, help='side length of the generated query squares')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs over the queries before measuring')
+    parser.add_argument('--repeats', type=int, default=5, help='timed runs over the queries')
+    parser.add_argument('--build-repeats', type=int, default=3, help='timed builds per index, the median is reported')
+    parser.add_argument('--max-insert-points', type=int, default=100000,
+                        help='skip the one-insert-per-point build above this many points')
+    parser.add_argument('--max-scan-points', type=int, default=100000,
+                        help='skip the sequential scan above this many points')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json', help='where to write the JSON results')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args)
+        },
+        'results': []
+    }
+    for name in args.datasets.split(','):
+        if name == 'file':
+            points = read_points(args.dataset)
+            results['results'].append(run_benchmark(args.dataset, points, read_queries(args.queries), args))
+        else:
+            for size in [int(size) for size in args.sizes.split(',')]:
+                points = DATASETS[name](size, seed=args.seed)
+                queries = random_queries(points, args.num_queries, args.query_side, seed=args.seed)
+                results['results'].append(run_benchmark(name + '-' + str(size), points, queries, args))
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print("results written to", args.output)
+
+if __name__ == '__main__':
+    main()
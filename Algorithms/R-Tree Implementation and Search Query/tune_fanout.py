@@ -0,0 +1,63 @@
+import argparse
+import time as t
+
+from RTree import RTree, average_node_visits, read_points, read_queries
+
+# sweep the node capacity B of the R-Tree over the same data points and queries and report, for each fanout,
+# how long the tree takes to build and to query, how tall it is and how many nodes it has
+
+def tune_fanout(points, queries, fanouts, build='bulk', repeats=3):
+    results = []
+    for B in fanouts:
+        start_build = t.perf_counter()
+        if build == 'bulk':
+            rtree = RTree.bulk_load(points, B=B)
+        else:
+            rtree = RTree(B=B, rstar=(build == 'rstar'))
+            for point in points:
+                rtree.insert(rtree.root, point)
+        end_build = t.perf_counter()
+
+        #Best of several runs over all queries, to smooth out timer noise
+        best_query = None
+        for _ in range(repeats):
+            start_query = t.perf_counter()
+            for query in queries:
+                rtree.query(rtree.root, query)
+            end_query = t.perf_counter()
+            if best_query is None or end_query - start_query < best_query:
+                best_query = end_query - start_query
+
+        results.append({
+            'B': B,
+            'build_time': end_build - start_build,
+            'avg_query_time': best_query / len(queries),
+            'avg_node_visits': average_node_visits(rtree, queries),
+            'height': rtree.height(),
+            'node_count': rtree.node_count()
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep the R-Tree fanout B and report build time, query time, height and node count')
+    parser.add_argument('--dataset', default='dataset.txt', help='data points, one "id x y" per line')
+    parser.add_argument('--queries', default='test_query.txt', help='query rectangles, one "x1 x2 y1 y2" per line')
+    parser.add_argument('--fanouts', default='4,8,16,32,64,128', help='comma separated node capacities to try')
+    parser.add_argument('--build', choices=['bulk', 'insert', 'rstar'], default='bulk',
+                        help='STR bulk load, one insert per point, or one R*-tree insert per point')
+    parser.add_argument('--repeats', type=int, default=3, help='query runs per fanout, the fastest one is reported')
+    args = parser.parse_args()
+
+    points = read_points(args.dataset)
+    queries = read_queries(args.queries)
+    fanouts = [int(B) for B in args.fanouts.split(',')]
+
+    print("fanout sweep over", len(points), "points and", len(queries), "queries (" + args.build + " build)")
+    print("{:>6} {:>12} {:>16} {:>12} {:>8} {:>10}".format('B', 'build (s)', 'avg query (us)', 'node visits', 'height', 'nodes'))
+    for result in tune_fanout(points, queries, fanouts, args.build, args.repeats):
+        print("{:>6} {:>12.3f} {:>16.1f} {:>12.1f} {:>8} {:>10}".format(
+            result['B'], result['build_time'], result['avg_query_time'] * 1e6,
+            result['avg_node_visits'], result['height'], result['node_count']))
+
+if __name__ == '__main__':
+    main()
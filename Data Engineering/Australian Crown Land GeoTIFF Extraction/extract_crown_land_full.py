@@ -13,13 +13,587 @@ For testing, use extract_crown_land_sample.py instead.
 
 import rasterio
 from rasterio.features import shapes
+from rasterio.transform import Affine
+from rasterio.windows import Window
 import geopandas as gpd
-from shapely.geometry import shape
+import shapely
+from shapely.geometry import MultiPoint, shape
 import numpy as np
+import pandas as pd
+from pyproj import Transformer
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import hashlib
+import json
+import os
+import sqlite3
 import sys
 
-def extract_all_crown_land(tif_path, output_geojson, output_csv, progress_interval=5000):
+def tile_shape(src, tile_size):
+    """
+    Height and width of the tiles, tile_size rounded down to a whole
+    number of the file's internal blocks (at least one block).
+    
+    A striped file has blocks as wide as the raster, which would make
+    every tile a full-width strip. Along a side that one block spans,
+    tiles are cut at tile_size pixels instead; a windowed read still only
+    decodes the strips it needs, so memory stays bounded by the tile.
+    """
+    block_height, block_width = src.block_shapes[0]
+    if block_width >= src.width:
+        block_width = 1
+    if block_height >= src.height:
+        block_height = 1
+    tile_height = max(block_height, tile_size // block_height * block_height)
+    tile_width = max(block_width, tile_size // block_width * block_width)
+    return tile_height, tile_width
+
+def tile_windows(src, tile_size):
+    """
+    Split the raster into tiles of about tile_size x tile_size pixels.
+    
+    Tile sides are rounded down to a whole number of the file's internal
+    blocks, so each tile read decodes complete blocks only (see tile_shape
+    for striped files).
+    
+    Args:
+        src: Open rasterio dataset
+        tile_size: Target tile side in pixels
+    
+    Returns:
+        List of rasterio Windows covering the raster, row by row
+    """
+    tile_height, tile_width = tile_shape(src, tile_size)
+    
+    windows = []
+    for row in range(0, src.height, tile_height):
+        for col in range(0, src.width, tile_width):
+            windows.append(Window(col, row, min(tile_width, src.width - col), min(tile_height, src.height - row)))
+    return windows
+
+def extract_tile(src, window):
+    """
+    Polygonise the Crown Land pixels of one tile.
+    
+    The tile is read with a one pixel halo on every side that has a
+    neighbouring tile. Only the tile itself is polygonised; the halo is
+    compared with the tile's border pixels to find the seams where a
+    polygon carries on into the next tile with the same tenure code.
+    Polygons that reach a seam are returned as edge pieces to be stitched.
+    
+    Geometries are in pixel coordinates of the full raster (column, row).
+    Tile corners are then whole numbers, so pieces from neighbouring tiles
+    share exactly the same vertices along a seam.
+    
+    Args:
+        src: Open rasterio dataset
+        window: Tile window from tile_windows
+    
+    Returns:
+        Tuple (geometries, codes, piece_geometries, piece_codes,
+        crown_pixels): complete polygons and their tenure codes, pieces
+        cut at a seam and their tenure codes, and the number of Crown Land
+        pixels in the tile
+    """
+    row, col = int(window.row_off), int(window.col_off)
+    height, width = int(window.height), int(window.width)
+    top = 1 if row > 0 else 0
+    left = 1 if col > 0 else 0
+    bottom = 1 if row + height < src.height else 0
+    right = 1 if col + width < src.width else 0
+    
+    data = src.read(1, window=Window(col - left, row - top, width + left + right, height + top + bottom))
+    tile = data[top:top + height, left:left + width]
+    crown_mask = (tile >= 2000) & (tile < 3000) & (tile != src.nodata)
+    crown_pixels = int(np.sum(crown_mask))
+    if crown_pixels == 0:
+        return [], [], [], [], 0
+    
+    # Seams: border pixels whose neighbour in the halo has the same tenure code,
+    # marked by the midpoint of the pixel edge they share with that neighbour
+    sides = []
+    if top:
+        sides.append((tile[0, :], data[0, left:left + width], crown_mask[0, :], lambda i: (col + i + 0.5, row)))
+    if bottom:
+        sides.append((tile[-1, :], data[-1, left:left + width], crown_mask[-1, :], lambda i: (col + i + 0.5, row + height)))
+    if left:
+        sides.append((tile[:, 0], data[top:top + height, 0], crown_mask[:, 0], lambda i: (col, row + i + 0.5)))
+    if right:
+        sides.append((tile[:, -1], data[top:top + height, -1], crown_mask[:, -1], lambda i: (col + width, row + i + 0.5)))
+    
+    seam_points = {}
+    for border, halo, border_mask, edge_point in sides:
+        for i in np.flatnonzero(border_mask & (halo == border)):
+            seam_points.setdefault(int(border[i]), []).append(edge_point(i))
+    seams = {value: MultiPoint(points) for value, points in seam_points.items()}
+    
+    geometries = []
+    codes = []
+    piece_geometries = []
+    piece_codes = []
+    for geom, value in shapes(tile, mask=crown_mask, transform=Affine.translation(col, row)):
+        polygon = shape(geom)
+        value = int(value)
+        minx, miny, maxx, maxy = polygon.bounds
+        on_edge = minx == col or miny == row or maxx == col + width or maxy == row + height
+        if on_edge and value in seams and polygon.intersects(seams[value]):
+            piece_geometries.append(polygon)
+            piece_codes.append(value)
+        else:
+            geometries.append(polygon)
+            codes.append(value)
+    return geometries, codes, piece_geometries, piece_codes, crown_pixels
+
+def order_ring(coords, ccw):
+    """
+    Closed ring coordinates, without the closing vertex, turned to the
+    given orientation and rotated to start at the top-most, then left-most
+    vertex (pixel coordinates, rows growing downwards).
+    """
+    coords = np.asarray(coords)[:-1]
+    if shapely.is_ccw(shapely.LinearRing(coords)) != ccw:
+        coords = coords[::-1]
+    return np.roll(coords, -np.lexsort((coords[:, 0], coords[:, 1]))[0], axis=0)
+
+def order_like_shapes(polygon):
+    """
+    Rebuild a polygon in pixel coordinates with its rings in the order
+    shapes() writes them: a clockwise exterior and counter-clockwise holes,
+    each starting as in order_ring, and the holes sorted by their first
+    vertex.
+    """
+    holes = sorted((order_ring(interior.coords, True) for interior in polygon.interiors),
+                   key=lambda coords: (coords[0, 1], coords[0, 0]))
+    return shapely.Polygon(order_ring(polygon.exterior.coords, False), holes)
+
+def stitch_edge_pieces(piece_geometries, piece_codes):
+    """
+    Merge polygon pieces cut at tile seams back into whole polygons.
+    
+    Pieces are unioned per tenure code. Pieces that only meet at a corner
+    stay separate polygons, as shapes() would have returned them. The
+    union keeps the vertices where pieces met along a seam, in the middle
+    of straight edges; they are simplified away while the polygons are
+    still in pixel coordinates, and the rings are put in the order of
+    order_like_shapes, so the result is the same as the whole raster
+    polygonised at once.
+    
+    Args:
+        piece_geometries: Pieces cut at a seam, from extract_tile
+        piece_codes: Tenure code of each piece
+    
+    Returns:
+        Tuple (geometries, codes) of the stitched polygons as arrays
+    """
+    piece_geometries = np.asarray(piece_geometries, dtype=object)
+    piece_codes = np.asarray(piece_codes, dtype='int64')
+    
+    geometries = []
+    codes = []
+    for value in np.unique(piece_codes):
+        polygons = shapely.simplify(shapely.get_parts(shapely.union_all(piece_geometries[piece_codes == value])), 0)
+        polygons = np.array([order_like_shapes(polygon) for polygon in polygons], dtype=object)
+        geometries.append(polygons)
+        codes.append(np.full(len(polygons), value, dtype='int64'))
+    if not geometries:
+        return np.array([], dtype=object), np.array([], dtype='int64')
+    return np.concatenate(geometries), np.concatenate(codes)
+
+def init_tile_worker(tif_path):
+    """Open the GeoTIFF once in each worker process, for extract_tile_wkb."""
+    global worker_src
+    worker_src = rasterio.open(tif_path)
+
+def extract_tile_wkb(window):
+    """
+    Run extract_tile in a worker process on its own copy of the GeoTIFF.
+    
+    Returns:
+        The extract_tile tuple, with geometries as WKB so they are cheap
+        to send back to the parent
+    """
+    geometries, codes, piece_geometries, piece_codes, crown_pixels = extract_tile(worker_src, window)
+    return shapely.to_wkb(geometries).tolist(), codes, shapely.to_wkb(piece_geometries).tolist(), piece_codes, crown_pixels
+
+def tile_results(src, windows, workers=1):
+    """
+    Yield extract_tile results for each window, in window order.
+    
+    With more than one worker the tiles are polygonised in a process pool.
+    Each worker opens the GeoTIFF itself and sends its polygons back as
+    WKB, which are decoded here.
+    """
+    if workers <= 1:
+        for window in windows:
+            yield extract_tile(src, window)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_tile_worker, initargs=(src.name,)) as executor:
+        for wkb, codes, piece_wkb, piece_codes, crown_pixels in executor.map(extract_tile_wkb, windows):
+            yield shapely.from_wkb(wkb), codes, shapely.from_wkb(piece_wkb), piece_codes, crown_pixels
+
+def extract_features_tiled(src, tile_size, progress_interval=5000, workers=1):
+    """
+    Polygonise all Crown Land pixels one tile at a time.
+    
+    Only one tile and its halo is held in memory at once, instead of the
+    whole raster. Polygons cut by tile edges are stitched at the end and
+    all geometries are then moved from pixel coordinates to the raster CRS.
+    
+    Args:
+        src: Open rasterio dataset
+        tile_size: Target tile side in pixels
+        progress_interval: Print progress every N features
+        workers: Number of processes polygonising tiles in parallel
+    
+    Returns:
+        Tuple (geometries, codes, crown_pixels), with the geometries and
+        their tenure codes as arrays
+    """
+    windows = tile_windows(src, tile_size)
+    print(f"   {len(windows):,} tiles on {workers} worker process(es), progress will be shown every {progress_interval:,} features\n")
+    
+    # Per-tile arrays are only joined once at the end
+    geometries = []
+    codes = []
+    piece_geometries = []
+    piece_codes = []
+    feature_count = 0
+    crown_pixels = 0
+    next_report = progress_interval
+    start_time = datetime.now()
+    
+    for i, tile in enumerate(tile_results(src, windows, workers), 1):
+        tile_geometries, tile_codes, tile_piece_geometries, tile_piece_codes, tile_crown_pixels = tile
+        geometries.append(np.asarray(tile_geometries, dtype=object))
+        codes.append(np.asarray(tile_codes, dtype='int64'))
+        piece_geometries.extend(tile_piece_geometries)
+        piece_codes.extend(tile_piece_codes)
+        feature_count += len(tile_codes)
+        crown_pixels += tile_crown_pixels
+        
+        if feature_count >= next_report:
+            elapsed = (datetime.now() - start_time).total_seconds()
+            rate = feature_count / elapsed if elapsed > 0 else 0
+            print(f"   Progress: tile {i:,}/{len(windows):,}, {feature_count:,} features extracted ({rate:.1f} features/sec)")
+            next_report = (feature_count // progress_interval + 1) * progress_interval
+    
+    print(f"\n🧵 Stitching {len(piece_codes):,} polygon pieces cut at tile edges...")
+    stitched_geometries, stitched_codes = stitch_edge_pieces(piece_geometries, piece_codes)
+    geometries = np.concatenate(geometries + [stitched_geometries])
+    codes = np.concatenate(codes + [stitched_codes])
+    
+    return pixel_to_crs(geometries, src.transform), codes, crown_pixels
+
+def pixel_to_crs(geometries, t):
+    """
+    Move geometries from pixel (column, row) coordinates to the raster CRS
+    in one vectorised call. With the inverse transform, ~t, it moves them
+    back to pixel coordinates.
+    """
+    return shapely.transform(geometries, lambda xy: xy @ np.array([[t.a, t.d], [t.b, t.e]]) + [t.c, t.f])
+
+def describe_codes(codes, descriptions):
+    """
+    Map tenure codes to their descriptions as a categorical column.
+    
+    Args:
+        codes: Series of integer codes
+        descriptions: Dict of code -> description, missing codes are "Unknown"
+    
+    Returns:
+        Categorical Series of descriptions, aligned with codes
+    """
+    values, uniques = pd.factorize(codes)
+    categories = [descriptions.get(code, "Unknown") for code in uniques]
+    # Several codes can share a description, so the categories are made unique
+    # and the per-row codes remapped onto them
+    unique_categories, remap = np.unique(categories, return_inverse=True)
+    return pd.Series(pd.Categorical.from_codes(remap[values], unique_categories), index=codes.index)
+
+def reproject_with_centroids(geometries, src_crs, dst_crs):
+    """
+    Reproject geometries and their centroids in a single transformer call.
+    
+    The vertices of every geometry and the centroid of every geometry
+    (taken in src_crs) are gathered into one pair of coordinate arrays and
+    transformed together. Bounding boxes are then reduced from the
+    transformed vertices, so no geometry is walked again.
+    
+    Args:
+        geometries: Array of shapely geometries in src_crs, none empty
+        src_crs: CRS of the geometries
+        dst_crs: CRS to reproject to
+    
+    Returns:
+        Tuple (geometries, centroids, bounds): reprojected geometries, an
+        (N, 2) array of reprojected centroid x/y and an (N, 4) array of
+        minx, miny, maxx, maxy per geometry
+    """
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    centroids = shapely.get_coordinates(shapely.centroid(geometries))
+    
+    transformer = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+    x, y = transformer.transform(np.concatenate([coords[:, 0], centroids[:, 0]]),
+                                 np.concatenate([coords[:, 1], centroids[:, 1]]))
+    coords = np.column_stack([x[:len(coords)], y[:len(coords)]])
+    centroids = np.column_stack([x[len(coords):], y[len(coords):]])
+    
+    geometries = shapely.set_coordinates(np.array(geometries, dtype=object), coords)
+    
+    # Vertices come out grouped by geometry, so each geometry's bounds is one reduceat segment
+    starts = np.flatnonzero(np.diff(index, prepend=-1))
+    bounds = np.column_stack([
+        np.minimum.reduceat(coords[:, 0], starts), np.minimum.reduceat(coords[:, 1], starts),
+        np.maximum.reduceat(coords[:, 0], starts), np.maximum.reduceat(coords[:, 1], starts)
+    ])
+    return geometries, centroids, bounds
+
+def build_crown_land_frame(geometries, codes, crs):
+    """
+    Build the Crown Land GeoDataFrame from polygonised geometries.
+    
+    Adds the tenure classifications and descriptions and the areas, then
+    reprojects to WGS84 with centroids and bounding boxes.
+    
+    Args:
+        geometries: Array of polygons in the raster CRS
+        codes: Tenure code of each polygon
+        crs: CRS of the raster
+    
+    Returns:
+        GeoDataFrame in WGS84 (lat/lon)
+    """
+    # Create GeoDataFrame straight from the geometry and code columns
+    print(f"\n🗺️  Creating GeoDataFrame...")
+    gdf = gpd.GeoDataFrame({'tenure_code': np.asarray(codes, dtype='int64')},
+                           geometry=np.asarray(geometries, dtype=object), crs=crs)
+    
+    # Add classifications
+    print(f"   Adding tenure classifications...")
+    gdf['L1N'] = (gdf['tenure_code'] // 1000).astype(int)
+    gdf['L2N'] = (gdf['tenure_code'] // 100).astype(int)
+    gdf['L3N'] = (gdf['tenure_code'] // 10).astype(int)
+    gdf['L4N'] = gdf['tenure_code']
+    
+    # Add descriptions
+    l1_desc = {1: "Freehold", 2: "Crown land"}
+    l2_desc = {10: "Freehold", 21: "Leasehold", 22: "Crown purposes", 23: "Other Crown land"}
+    l3_desc = {
+        211: "Freeholding lease", 212: "Pastoral perpetual lease",
+        213: "Other perpetual lease", 214: "Pastoral term lease",
+        215: "Other term lease", 216: "Other lease",
+        221: "Nature conservation reserve", 222: "Multiple-use public forest",
+        223: "Other Crown purposes", 230: "Other Crown land"
+    }
+    
+    # Each distinct code is looked up once, then spread over the rows as categorical codes
+    gdf['L1_DESC'] = describe_codes(gdf['L1N'], l1_desc)
+    gdf['L2_DESC'] = describe_codes(gdf['L2N'], l2_desc)
+    gdf['L3_DESC'] = describe_codes(gdf['L3N'], l3_desc)
+    
+    # Calculate area
+    print(f"   Calculating areas...")
+    gdf['area_m2'] = gdf.geometry.area
+    gdf['area_km2'] = gdf['area_m2'] / 1_000_000
+    
+    # Convert to WGS84 (lat/lon), geometries and centroids together
+    # (centroids are taken in the original projection to avoid warnings)
+    print(f"\n🌐 Converting to WGS84 (Latitude/Longitude) with centroids and bounding boxes...")
+    geometries_wgs84, centroids_wgs84, bounds = reproject_with_centroids(gdf.geometry.values, crs, 'EPSG:4326')
+    gdf_wgs84 = gdf.set_geometry(gpd.GeoSeries(geometries_wgs84, index=gdf.index, crs='EPSG:4326'))
+    gdf_wgs84['centroid_lon'] = centroids_wgs84[:, 0]
+    gdf_wgs84['centroid_lat'] = centroids_wgs84[:, 1]
+    gdf_wgs84['bbox_west'] = bounds[:, 0]
+    gdf_wgs84['bbox_south'] = bounds[:, 1]
+    gdf_wgs84['bbox_east'] = bounds[:, 2]
+    gdf_wgs84['bbox_north'] = bounds[:, 3]
+    
+    return gdf_wgs84
+
+def write_csv(gdf_wgs84, output_csv):
+    """
+    Save the Crown Land attributes to CSV, with the geometry as WKT in the
+    last column.
+    
+    Args:
+        gdf_wgs84: GeoDataFrame from build_crown_land_frame
+        output_csv: Path to save CSV output
+    """
+    # Prepare and save CSV with geometry as WKT in last column
+    print(f"\n💾 Saving CSV to: {output_csv}")
+    # Drop the geometry column (without copying the geometries first)
+    csv_data = pd.DataFrame(gdf_wgs84.drop(columns=['geometry']))
+    
+    # Convert geometry to WKT (Well-Known Text) format for CSV, in one call over the geometry array
+    # (rounding_precision=-1 gives the same full precision text as geom.wkt)
+    print(f"   Converting geometries to WKT format...")
+    csv_data['geometry_wkt'] = shapely.to_wkt(gdf_wgs84.geometry.values, rounding_precision=-1)
+    
+    # Reorder columns: tenure info first, then spatial data, geometry last
+    column_order = [
+        'tenure_code',
+        'L1N', 'L1_DESC',
+        'L2N', 'L2_DESC', 
+        'L3N', 'L3_DESC',
+        'L4N',
+        'area_m2', 'area_km2',
+        'centroid_lon', 'centroid_lat',
+        'bbox_west', 'bbox_south', 'bbox_east', 'bbox_north',
+        'geometry_wkt'
+    ]
+    
+    csv_data = csv_data[column_order]
+    
+    # Save to CSV
+    csv_data.to_csv(output_csv, index=False)
+    print(f"   ✓ CSV saved successfully")
+    print(f"   Columns: {len(column_order)}")
+    print(f"   Rows: {len(csv_data):,}")
+
+def tile_hashes(src, windows):
+    """
+    Hash the pixels of every tile, keyed by the tile's (row, column) index.
+    
+    Returns:
+        Dict of "row,col" -> hex digest
+    """
+    tile_height, tile_width = int(windows[0].height), int(windows[0].width)
+    hashes = {}
+    for window in windows:
+        key = f"{int(window.row_off) // tile_height},{int(window.col_off) // tile_width}"
+        hashes[key] = hashlib.blake2b(src.read(1, window=window).tobytes(), digest_size=16).hexdigest()
+    return hashes
+
+def tile_spans(geometries, transform, tile_height, tile_width):
+    """
+    First and last tile row and column covered by each geometry.
+    
+    Args:
+        geometries: Array of polygons in the raster CRS, or in pixel
+            coordinates with transform None
+        transform: Raster transform
+        tile_height, tile_width: Tile shape from tile_shape
+    
+    Returns:
+        (N, 4) integer array of first row, first column, last row, last column
+    """
+    minx, miny, maxx, maxy = shapely.bounds(geometries).reshape(-1, 4).T
+    if transform is None:
+        cols1, rows1, cols2, rows2 = minx, miny, maxx, maxy
+    else:
+        cols1, rows1 = ~transform * (minx, miny)
+        cols2, rows2 = ~transform * (maxx, maxy)
+    # Polygon vertices lie on pixel corners, so the pixel bounds round to whole numbers
+    col_min = np.rint(np.minimum(cols1, cols2)).astype('int64')
+    col_max = np.rint(np.maximum(cols1, cols2)).astype('int64')
+    row_min = np.rint(np.minimum(rows1, rows2)).astype('int64')
+    row_max = np.rint(np.maximum(rows1, rows2)).astype('int64')
+    return np.column_stack([row_min // tile_height, col_min // tile_width,
+                            (row_max - 1) // tile_height, (col_max - 1) // tile_width])
+
+def span_tiles(spans):
+    """Keys ("row,col") of every tile covered by any of the given tile spans."""
+    return {f"{row},{col}" for row1, col1, row2, col2 in spans
+            for row in range(row1, row2 + 1) for col in range(col1, col2 + 1)}
+
+def read_pixel_geometries(gpkg_path, layer, fids, crs, transform):
+    """
+    Read features from a GeoPackage back into pixel coordinates.
+    
+    The geometry blobs are read with sqlite3 rather than through GDAL, so
+    only the requested features are decoded. The WGS84 geometries are
+    reprojected to the raster CRS and then to pixel (column, row)
+    coordinates with the inverse of the raster transform. Every vertex lies
+    on a pixel corner, so the coordinates are rounded back to whole numbers
+    and match new polygons from extract_tile exactly.
+    
+    Args:
+        gpkg_path: Path to the GeoPackage
+        layer: Feature layer, from gpkg_layer_fids
+        fids: Feature ids to read
+        crs: CRS of the raster
+        transform: Raster transform
+    
+    Returns:
+        Array of polygons in pixel coordinates, in the order of fids
+    """
+    connection = sqlite3.connect(gpkg_path)
+    try:
+        column = connection.execute("SELECT column_name FROM gpkg_geometry_columns WHERE table_name = ?", (layer,)).fetchone()[0]
+        blobs = {}
+        # SQLite limits the number of parameters in one statement
+        for start in range(0, len(fids), 500):
+            chunk = fids[start:start + 500]
+            blobs.update(connection.execute(
+                f'SELECT rowid, "{column}" FROM "{layer}" WHERE rowid IN ({",".join("?" * len(chunk))})', chunk))
+    finally:
+        connection.close()
+    
+    # A GeoPackage geometry is WKB behind an 8 byte header and an envelope,
+    # whose size is given by bits 1-3 of the flags byte
+    envelope_sizes = (0, 32, 48, 48, 64)
+    geometries = shapely.from_wkb([bytes(blobs[fid][8 + envelope_sizes[(blobs[fid][3] >> 1) & 7]:]) for fid in fids])
+    
+    transformer = Transformer.from_crs('EPSG:4326', crs, always_xy=True)
+    geometries = shapely.transform(geometries, lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+    return shapely.transform(pixel_to_crs(geometries, ~transform), np.rint)
+
+def overlapping(geometries, others):
+    """
+    Pairs of polygons in pixel coordinates that share at least one pixel,
+    that is whose interiors intersect. Polygons that only touch along an
+    edge or at a corner are not counted.
+    
+    Returns:
+        Tuple (left, right) of index arrays into geometries and others
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    others = np.asarray(others, dtype=object)
+    if len(geometries) == 0 or len(others) == 0:
+        return np.array([], dtype='int64'), np.array([], dtype='int64')
+    left, right = shapely.STRtree(others).query(geometries, predicate='intersects')
+    shared = shapely.relate_pattern(geometries[left], others[right], '2********')
+    return left[shared], right[shared]
+
+def gpkg_layer_fids(gpkg_path):
+    """
+    Name of the feature layer of a GeoPackage and its feature ids, in order.
+    """
+    connection = sqlite3.connect(gpkg_path)
+    try:
+        layer = connection.execute("SELECT table_name FROM gpkg_contents WHERE data_type = 'features'").fetchone()[0]
+        fids = [row[0] for row in connection.execute(f'SELECT rowid FROM "{layer}" ORDER BY rowid')]
+    finally:
+        connection.close()
+    return layer, fids
+
+def raster_signature(src):
+    """Size, transform and CRS of the raster, which a manifest is only valid for."""
+    return {
+        'width': src.width,
+        'height': src.height,
+        'transform': list(src.transform)[:6],
+        'crs': src.crs.to_wkt()
+    }
+
+def write_manifest(manifest_path, src, tile_size, hashes, layer, fids, spans):
+    """
+    Save the tile hashes and the tiles spanned by each output feature, for
+    the next update_crown_land run.
+    """
+    manifest = {
+        'raster': raster_signature(src),
+        'tile_size': tile_size,
+        'tiles': hashes,
+        'layer': layer,
+        'features': {'fid': [int(fid) for fid in fids], 'span': np.asarray(spans).tolist()}
+    }
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    print(f"   ✓ Manifest saved to: {manifest_path} ({len(hashes):,} tiles, {len(fids):,} features)")
+
+def extract_all_crown_land(tif_path, output_geojson, output_csv, progress_interval=5000, tile_size=None, workers=1, manifest_path=None):
     """
     Extract ALL Crown Land polygons from the GeoTIFF.
     
@@ -31,18 +605,34 @@ def extract_all_crown_land(tif_path, output_geojson, output_csv, progress_interv
         output_geojson: Path to save GeoJSON output
         output_csv: Path to save CSV output
         progress_interval: Print progress every N features
+        tile_size: Read and polygonise the raster in tiles of about this
+            many pixels a side, stitching polygons across tile edges.
+            None reads the whole raster at once.
+        workers: Number of processes polygonising tiles in parallel,
+            needs tile_size
+        manifest_path: Save a manifest of tile hashes here, so later
+            releases can be applied with update_crown_land. Needs
+            tile_size and a .gpkg output
     
     Returns:
         GeoDataFrame with all Crown Land polygons in WGS84 (lat/lon)
     """
     
+    if workers > 1 and tile_size is None:
+        raise ValueError("workers > 1 needs a tile_size, the whole raster is polygonised in one piece")
+    if manifest_path is not None and (tile_size is None or not output_geojson.endswith('.gpkg')):
+        raise ValueError("a manifest needs a tile_size and a .gpkg output, which update_crown_land patches")
+    
     print("="*80)
     print("FULL CROWN LAND EXTRACTION")
     print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("="*80)
     print("\n⚠️  WARNING: This will process the ENTIRE dataset")
     print("   Estimated time: 30-60 minutes")
-    print("   Estimated memory: 8-16 GB")
+    if tile_size is None:
+        print("   Estimated memory: 8-16 GB")
+    else:
+        print(f"   Raster read in {tile_size:,} x {tile_size:,} pixel tiles")
     print("\n   Press Ctrl+C within 5 seconds to cancel...")
     
     try:
@@ -60,97 +650,67 @@ def extract_all_crown_land(tif_path, output_geojson, output_csv, progress_interv
         print(f"   Dimensions: {src.width} x {src.height} pixels")
         print(f"   Resolution: 250m x 250m")
         
-        # Read the entire raster
-        print(f"\n📊 Reading full raster data...")
-        print(f"   (This may take several minutes...)")
-        data = src.read(1)
-        
-        # Create mask for Crown land (values 2000-2999)
-        print(f"\n🔍 Identifying Crown Land pixels...")
-        crown_mask = (data >= 2000) & (data < 3000) & (data != src.nodata)
-        
-        crown_pixels = np.sum(crown_mask)
-        total_pixels = data.size
-        crown_pct = (crown_pixels / total_pixels) * 100
-        
-        print(f"   ✓ Crown Land pixels: {crown_pixels:,} ({crown_pct:.2f}% of Australia)")
-        print(f"   ✓ Approximate area: {(crown_pixels * 0.0625):.0f} km²")
-        
-        if crown_pixels == 0:
-            print("\n⚠️  No Crown Land pixels found!")
-            return None
-        
-        # Extract shapes
-        print(f"\n🔄 Converting raster to vector polygons...")
-        print(f"   (This is the slowest step - may take 20-40 minutes)")
-        print(f"   Progress will be shown every {progress_interval:,} features\n")
-        
-        features = []
-        start_time = datetime.now()
-        
-        for geom, value in shapes(data, mask=crown_mask, transform=src.transform):
-            features.append({
-                'geometry': shape(geom),
-                'tenure_code': int(value)
-            })
-            
-            if len(features) % progress_interval == 0:
-                elapsed = (datetime.now() - start_time).total_seconds()
-                rate = len(features) / elapsed if elapsed > 0 else 0
-                print(f"   Progress: {len(features):,} features extracted ({rate:.1f} features/sec)")
-        
-        elapsed = (datetime.now() - start_time).total_seconds()
-        print(f"\n   ✓ Extracted {len(features):,} total features in {elapsed/60:.1f} minutes")
-        
-        # Create GeoDataFrame
-        print(f"\n🗺️  Creating GeoDataFrame...")
-        gdf = gpd.GeoDataFrame(features, crs=src.crs)
-        
-        # Add classifications
-        print(f"   Adding tenure classifications...")
-        gdf['L1N'] = (gdf['tenure_code'] // 1000).astype(int)
-        gdf['L2N'] = (gdf['tenure_code'] // 100).astype(int)
-        gdf['L3N'] = (gdf['tenure_code'] // 10).astype(int)
-        gdf['L4N'] = gdf['tenure_code']
-        
-        # Add descriptions
-        l1_desc = {1: "Freehold", 2: "Crown land"}
-        l2_desc = {10: "Freehold", 21: "Leasehold", 22: "Crown purposes", 23: "Other Crown land"}
-        l3_desc = {
-            211: "Freeholding lease", 212: "Pastoral perpetual lease",
-            213: "Other perpetual lease", 214: "Pastoral term lease",
-            215: "Other term lease", 216: "Other lease",
-            221: "Nature conservation reserve", 222: "Multiple-use public forest",
-            223: "Other Crown purposes", 230: "Other Crown land"
-        }
-        
-        gdf['L1_DESC'] = gdf['L1N'].apply(lambda x: l1_desc.get(x, "Unknown"))
-        gdf['L2_DESC'] = gdf['L2N'].apply(lambda x: l2_desc.get(x, "Unknown"))
-        gdf['L3_DESC'] = gdf['L3N'].apply(lambda x: l3_desc.get(x, "Unknown"))
-        
-        # Calculate area
-        print(f"   Calculating areas...")
-        gdf['area_m2'] = gdf.geometry.area
-        gdf['area_km2'] = gdf['area_m2'] / 1_000_000
-        
-        # Convert to WGS84 (lat/lon)
-        print(f"\n🌐 Converting to WGS84 (Latitude/Longitude)...")
-        gdf_wgs84 = gdf.to_crs('EPSG:4326')
-        
-        # Add centroid coordinates (in original projection to avoid warnings)
-        print(f"   Adding centroid coordinates...")
-        centroids = gdf.geometry.centroid
-        centroids_wgs84 = gpd.GeoSeries(centroids, crs=src.crs).to_crs('EPSG:4326')
-        gdf_wgs84['centroid_lon'] = centroids_wgs84.x
-        gdf_wgs84['centroid_lat'] = centroids_wgs84.y
-        
-        # Add bounding boxes
-        print(f"   Adding bounding boxes...")
-        bounds = gdf_wgs84.geometry.bounds
-        gdf_wgs84['bbox_west'] = bounds.minx
-        gdf_wgs84['bbox_south'] = bounds.miny
-        gdf_wgs84['bbox_east'] = bounds.maxx
-        gdf_wgs84['bbox_north'] = bounds.maxy
+        if tile_size is None:
+            # Read the entire raster
+            print(f"\n📊 Reading full raster data...")
+            print(f"   (This may take several minutes...)")
+            data = src.read(1)
+            
+            # Create mask for Crown land (values 2000-2999)
+            print(f"\n🔍 Identifying Crown Land pixels...")
+            crown_mask = (data >= 2000) & (data < 3000) & (data != src.nodata)
+            
+            crown_pixels = np.sum(crown_mask)
+            total_pixels = data.size
+            crown_pct = (crown_pixels / total_pixels) * 100
+            
+            print(f"   ✓ Crown Land pixels: {crown_pixels:,} ({crown_pct:.2f}% of Australia)")
+            print(f"   ✓ Approximate area: {(crown_pixels * 0.0625):.0f} km²")
+            
+            if crown_pixels == 0:
+                print("\n⚠️  No Crown Land pixels found!")
+                return None
+            
+            # Extract shapes
+            print(f"\n🔄 Converting raster to vector polygons...")
+            print(f"   (This is the slowest step - may take 20-40 minutes)")
+            print(f"   Progress will be shown every {progress_interval:,} features\n")
+            
+            geometries = []
+            codes = []
+            start_time = datetime.now()
+            
+            for geom, value in shapes(data, mask=crown_mask, transform=src.transform):
+                geometries.append(shape(geom))
+                codes.append(int(value))
+            
+                if len(geometries) % progress_interval == 0:
+                    elapsed = (datetime.now() - start_time).total_seconds()
+                    rate = len(geometries) / elapsed if elapsed > 0 else 0
+                    print(f"   Progress: {len(geometries):,} features extracted ({rate:.1f} features/sec)")
+            
+            elapsed = (datetime.now() - start_time).total_seconds()
+            print(f"\n   ✓ Extracted {len(geometries):,} total features in {elapsed/60:.1f} minutes")
+            
+        else:
+            # Read the raster one tile at a time
+            print(f"\n📊 Reading the raster in tiles of about {tile_size:,} x {tile_size:,} pixels...")
+            start_time = datetime.now()
+            geometries, codes, crown_pixels = extract_features_tiled(src, tile_size, progress_interval, workers)
+            
+            total_pixels = src.width * src.height
+            crown_pct = (crown_pixels / total_pixels) * 100
+            print(f"\n   ✓ Crown Land pixels: {crown_pixels:,} ({crown_pct:.2f}% of Australia)")
+            print(f"   ✓ Approximate area: {(crown_pixels * 0.0625):.0f} km²")
+            
+            if crown_pixels == 0:
+                print("\n⚠️  No Crown Land pixels found!")
+                return None
+            
+            elapsed = (datetime.now() - start_time).total_seconds()
+            print(f"\n   ✓ Extracted {len(geometries):,} total features in {elapsed/60:.1f} minutes")
+        
+        gdf_wgs84 = build_crown_land_frame(geometries, codes, src.crs)
         
         # Summary statistics
         print("\n" + "="*80)
@@ -160,14 +720,14 @@ def extract_all_crown_land(tif_path, output_geojson, output_csv, progress_interv
         print(f"Total Crown Land area: {gdf_wgs84['area_km2'].sum():,.0f} km²")
         
         print(f"\n📊 Breakdown by Level 2 Classification:")
-        for l2_desc, group in gdf_wgs84.groupby('L2_DESC'):
+        for l2_desc, group in gdf_wgs84.groupby('L2_DESC', observed=True):
             count = len(group)
             area = group['area_km2'].sum()
             pct = (area / gdf_wgs84['area_km2'].sum()) * 100
             print(f"  {l2_desc:30s}: {count:8,} features, {area:12,.0f} km² ({pct:5.1f}%)")
         
         print(f"\n📊 Breakdown by Level 3 Classification:")
-        for l3_desc, group in gdf_wgs84.groupby('L3_DESC'):
+        for l3_desc, group in gdf_wgs84.groupby('L3_DESC', observed=True):
             count = len(group)
             area = group['area_km2'].sum()
             pct = (area / gdf_wgs84['area_km2'].sum()) * 100
@@ -197,37 +757,13 @@ def extract_all_crown_land(tif_path, output_geojson, output_csv, progress_interv
         
         print(f"   ✓ GeoJSON saved successfully")
         
-        # Prepare and save CSV with geometry as WKT in last column
-        print(f"\n💾 Saving CSV to: {output_csv}")
-        csv_data = gdf_wgs84.copy()
-        
-        # Convert geometry to WKT (Well-Known Text) format for CSV
-        print(f"   Converting geometries to WKT format...")
-        csv_data['geometry_wkt'] = csv_data.geometry.apply(lambda geom: geom.wkt)
-        
-        # Drop the geometry column
-        csv_data = csv_data.drop(columns=['geometry'])
-        
-        # Reorder columns: tenure info first, then spatial data, geometry last
-        column_order = [
-            'tenure_code',
-            'L1N', 'L1_DESC',
-            'L2N', 'L2_DESC', 
-            'L3N', 'L3_DESC',
-            'L4N',
-            'area_m2', 'area_km2',
-            'centroid_lon', 'centroid_lat',
-            'bbox_west', 'bbox_south', 'bbox_east', 'bbox_north',
-            'geometry_wkt'
-        ]
-        
-        csv_data = csv_data[column_order]
-        
-        # Save to CSV
-        csv_data.to_csv(output_csv, index=False)
-        print(f"   ✓ CSV saved successfully")
-        print(f"   Columns: {len(column_order)}")
-        print(f"   Rows: {len(csv_data):,}")
+        write_csv(gdf_wgs84, output_csv)
+        
+        if manifest_path is not None:
+            print(f"\n🔑 Hashing tiles for incremental updates...")
+            layer, fids = gpkg_layer_fids(output_geojson)
+            spans = tile_spans(np.asarray(geometries, dtype=object), src.transform, *tile_shape(src, tile_size))
+            write_manifest(manifest_path, src, tile_size, tile_hashes(src, tile_windows(src, tile_size)), layer, fids, spans)
         
         total_time = (datetime.now() - start_time).total_seconds()
         print("\n" + "="*80)
@@ -237,14 +773,199 @@ def extract_all_crown_land(tif_path, output_geojson, output_csv, progress_interv
         
         return gdf_wgs84
 
+def update_crown_land(tif_path, output_gpkg, output_csv, manifest_path, progress_interval=5000):
+    """
+    Apply a new release of the GeoTIFF to a previous extraction in place.
+    
+    Every tile is hashed and compared with the manifest written by
+    extract_all_crown_land (or by the previous update). Only the changed
+    tiles are polygonised again, together with the tiles that the changed
+    polygons, old and new, reach into. Old features are read back from the
+    GeoPackage to tell the changed polygons of that region from the
+    unchanged ones. The changed features are deleted from the GeoPackage
+    and their replacements appended; the CSV is then rewritten from the
+    GeoPackage.
+    
+    Args:
+        tif_path: Path to the new GeoTIFF file
+        output_gpkg: GeoPackage from the previous run, patched in place
+        output_csv: Path to save CSV output
+        manifest_path: Manifest from the previous run, updated in place
+        progress_interval: Print progress every N tiles
+    
+    Returns:
+        GeoDataFrame with all Crown Land polygons in WGS84 (lat/lon)
+    """
+    print("="*80)
+    print("INCREMENTAL CROWN LAND UPDATE")
+    print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("="*80)
+    start_time = datetime.now()
+    
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    
+    with rasterio.open(tif_path) as src:
+        if manifest['raster'] != raster_signature(src):
+            raise ValueError("the raster's size, transform or CRS differs from the manifest, run extract_all_crown_land instead")
+        
+        tile_size = manifest['tile_size']
+        tile_height, tile_width = tile_shape(src, tile_size)
+        windows = {f"{int(w.row_off) // tile_height},{int(w.col_off) // tile_width}": w for w in tile_windows(src, tile_size)}
+        
+        # Compare tile hashes with the previous run
+        print(f"\n🔑 Hashing {len(windows):,} tiles of about {tile_size:,} x {tile_size:,} pixels...")
+        hashes = tile_hashes(src, list(windows.values()))
+        changed = [key for key, digest in hashes.items() if manifest['tiles'].get(key) != digest]
+        print(f"   ✓ {len(changed):,} changed tiles")
+        
+        if not changed:
+            print("\n✓ Nothing to update")
+            return gpd.read_file(output_gpkg, layer=manifest['layer'])
+        
+        old_fids = manifest['features']['fid']
+        old_spans = manifest['features']['span']
+        
+        layer = manifest['layer']
+        
+        # Old features by the tiles they cover
+        features_by_tile = {}
+        for i, (row1, col1, row2, col2) in enumerate(old_spans):
+            for row in range(row1, row2 + 1):
+                for col in range(col1, col2 + 1):
+                    features_by_tile.setdefault(f"{row},{col}", []).append(i)
+        
+        # Changed tiles shrunk by half a pixel, so a polygon only hits one if it has a pixel in it
+        changed_tiles = shapely.STRtree([
+            shapely.box(windows[key].col_off + 0.5, windows[key].row_off + 0.5,
+                        windows[key].col_off + windows[key].width - 0.5, windows[key].row_off + windows[key].height - 0.5)
+            for key in changed])
+        
+        # Old features on a changed tile are replaced. New polygons are written
+        # if they have a pixel in a changed tile or overlap a replaced feature,
+        # and replace every old feature they overlap. The region grows over the
+        # tiles of the replaced features and along the seams that the written
+        # polygons cross, until both sets stop growing. Polygons of the region
+        # that are not written are unchanged, and their old features are kept.
+        print(f"\n🔄 Re-polygonising changed tiles...")
+        stale = {i for key in changed for i in features_by_tile.get(key, [])}
+        region = set(changed) | span_tiles(old_spans[i] for i in stale)
+        results = {}
+        old_geometries = {}
+        while True:
+            for key in sorted(region - results.keys()):
+                results[key] = extract_tile(src, windows[key])
+                if len(results) % progress_interval == 0:
+                    print(f"   Progress: {len(results):,} tiles polygonised")
+            
+            # Complete polygons of the region and its stitched seam pieces, in pixel coordinates
+            geometries = [np.asarray(result[0], dtype=object) for result in results.values()]
+            codes = [np.asarray(result[1], dtype='int64') for result in results.values()]
+            piece_geometries = [piece for result in results.values() for piece in result[2]]
+            piece_codes = [code for result in results.values() for code in result[3]]
+            stitched_geometries, stitched_codes = stitch_edge_pieces(piece_geometries, piece_codes)
+            geometries = np.concatenate(geometries + [stitched_geometries])
+            codes = np.concatenate(codes + [stitched_codes])
+            
+            # Old features of the region, read back once each
+            nearby = sorted({i for key in region for i in features_by_tile.get(key, [])} - old_geometries.keys())
+            if nearby:
+                pixel_geometries = read_pixel_geometries(output_gpkg, layer, [old_fids[i] for i in nearby], src.crs, src.transform)
+                old_geometries.update(zip(nearby, pixel_geometries))
+            
+            needed = np.zeros(len(geometries), dtype=bool)
+            needed[changed_tiles.query(geometries, predicate='intersects')[0]] = True
+            stale_list = sorted(stale)
+            needed[overlapping(geometries, [old_geometries[i] for i in stale_list])[0]] = True
+            
+            kept = sorted({i for key in region for i in features_by_tile.get(key, [])} - stale)
+            new_stale = {kept[j] for j in overlapping(geometries[needed], [old_geometries[i] for i in kept])[1]}
+            
+            # Region edges with a tile outside the region, and the tile across each
+            edges = []
+            neighbours = []
+            for key in region:
+                tile_row, tile_col = (int(part) for part in key.split(','))
+                window = windows[key]
+                row, col = int(window.row_off), int(window.col_off)
+                row2, col2 = row + int(window.height), col + int(window.width)
+                for neighbour, edge in ((f"{tile_row - 1},{tile_col}", [(col, row), (col2, row)]),
+                                        (f"{tile_row + 1},{tile_col}", [(col, row2), (col2, row2)]),
+                                        (f"{tile_row},{tile_col - 1}", [(col, row), (col, row2)]),
+                                        (f"{tile_row},{tile_col + 1}", [(col2, row), (col2, row2)])):
+                    if neighbour in windows and neighbour not in region:
+                        edges.append(shapely.LineString(edge))
+                        neighbours.append(neighbour)
+            
+            grow = span_tiles(old_spans[i] for i in new_stale) - region
+            if edges:
+                grow |= {neighbours[j] for j in shapely.STRtree(edges).query(geometries[needed], predicate='intersects')[1]}
+            
+            stale |= new_stale
+            if not grow and not new_stale:
+                break
+            region |= grow
+        
+        print(f"   ✓ {len(results):,} of {len(windows):,} tiles polygonised, {len(stale):,} old features replaced")
+        
+        geometries = pixel_to_crs(geometries[needed], src.transform)
+        codes = codes[needed]
+        print(f"   ✓ {len(geometries):,} new features")
+        
+        # Patch the GeoPackage: delete the replaced features, append the new ones
+        print(f"\n💾 Patching GeoPackage: {output_gpkg}")
+        stale_fids = [old_fids[i] for i in sorted(stale)]
+        connection = sqlite3.connect(output_gpkg)
+        try:
+            last_fid = connection.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{layer}"').fetchone()[0]
+            connection.executemany(f'DELETE FROM "{layer}" WHERE rowid = ?', [(fid,) for fid in stale_fids])
+            connection.commit()
+        finally:
+            connection.close()
+        
+        new_fids = []
+        if len(geometries) > 0:
+            build_crown_land_frame(geometries, codes, src.crs).to_file(output_gpkg, driver='GPKG', layer=layer, mode='a')
+            connection = sqlite3.connect(output_gpkg)
+            try:
+                new_fids = [row[0] for row in connection.execute(f'SELECT rowid FROM "{layer}" WHERE rowid > ? ORDER BY rowid', (last_fid,))]
+            finally:
+                connection.close()
+        print(f"   ✓ {len(stale_fids):,} features deleted, {len(new_fids):,} appended")
+        
+        # Carry the untouched features over to the new manifest
+        keep = [i for i in range(len(old_fids)) if i not in stale]
+        fids = [old_fids[i] for i in keep] + new_fids
+        spans = [old_spans[i] for i in keep] + tile_spans(geometries, src.transform, tile_height, tile_width).tolist()
+        write_manifest(manifest_path, src, tile_size, hashes, layer, fids, spans)
+    
+    # The CSV has no stable row ids to patch, so it is rewritten from the GeoPackage
+    gdf_wgs84 = gpd.read_file(output_gpkg, layer=layer)
+    write_csv(gdf_wgs84, output_csv)
+    
+    total_time = (datetime.now() - start_time).total_seconds()
+    print("\n" + "="*80)
+    print("✅ UPDATE COMPLETE")
+    print(f"   Total processing time: {total_time/60:.1f} minutes")
+    print("="*80)
+    
+    return gdf_wgs84
+
 if __name__ == "__main__":
     # Configuration
     tif_path = "data/input/austen_v2_2020_21_alb_package_20241031/AUSTEN_v2_250m_2020_21_alb.tif"
     output_geojson = "data/output/crown_land_full.gpkg"  # GeoPackage is more efficient for large datasets
     output_csv = "data/output/crown_land_data_2020_21_full.csv"
+    tile_size = 2048  # Pixels per tile side, None reads the whole raster into memory at once
+    workers = os.cpu_count() or 1  # Processes polygonising tiles in parallel
+    manifest_path = "data/output/crown_land_full_manifest.json"  # Tile hashes for incremental updates, None to skip
     
-    # Run extraction
-    gdf = extract_all_crown_land(tif_path, output_geojson, output_csv)
+    # Run extraction, or only redo the changed tiles when a previous run left a manifest
+    if manifest_path is not None and os.path.exists(manifest_path) and os.path.exists(output_geojson):
+        gdf = update_crown_land(tif_path, output_geojson, output_csv, manifest_path)
+    else:
+        gdf = extract_all_crown_land(tif_path, output_geojson, output_csv, tile_size=tile_size, workers=workers,
+                                     manifest_path=manifest_path)
     
     if gdf is not None:
         print(f"\n✅ Success! Crown Land data extracted to:")
@@ -1,15 +1,109 @@
+import argparse
+import os
+
 import numpy as np
 import pandas as pd
-import matplotlib as mpl
-import matplotlib.pyplot as plt
+
+# matplotlib is only imported once a plot is asked for, see new_figure
 
 # parameters to be calculated
 theta = np.zeros((2,1))
 
 
 
+# closed-form least squares, solves X_new @ theta = y in one pass with an SVD based solver
+def least_squares (X_new, y):
+    return np.linalg.lstsq(X_new, y, rcond=None)[0]
+
+# closed-form least squares through the QR decomposition X_new = QR, then R theta = Q^T y
+def qr_solve (X_new, y):
+    Q, R = np.linalg.qr(X_new)
+    return np.linalg.solve(R, Q.T @ y)
+
+# full-batch gradient descent, stops early once a step changes no parameter by more than tol
+def gradient_descent (X_new, y, iterations, alpha, tol):
+    N = len(y)
+    theta = np.zeros((X_new.shape[1],1))
+    for i in range(0,iterations):
+        h = X_new @ theta
+        error = h - y
+        theta_change = alpha * (1/N) * X_new.T @ error
+        theta = theta - theta_change
+        if np.abs(theta_change).max() < tol:
+            print("gradient descent converged after " + str(i + 1) + " iterations")
+            break
+    return theta
+
+# mini-batch stochastic gradient descent, one epoch is a pass over the shuffled data in batches of batch_size
+# the mean squared error is noisy from epoch to epoch, so it stops early once patience epochs in a row have
+# not lowered the best error so far by more than tol (relative), and returns the best parameters seen
+def minibatch_sgd (X_new, y, epochs, alpha, tol, batch_size, seed, patience=50):
+    N = len(y)
+    rng = np.random.default_rng(seed)
+    theta = np.zeros((X_new.shape[1],1))
+    best_theta = theta
+    best_cost = np.mean((X_new @ theta - y) ** 2)
+    waited = 0
+    for epoch in range(0,epochs):
+        order = rng.permutation(N)
+        for start in range(0, N, batch_size):
+            batch = order[start:start + batch_size]
+            error = X_new[batch] @ theta - y[batch]
+            theta = theta - alpha * (1/len(batch)) * X_new[batch].T @ error
+        cost = np.mean((X_new @ theta - y) ** 2)
+        if cost < best_cost * (1 - tol):
+            best_theta = theta
+            best_cost = cost
+            waited = 0
+        else:
+            waited = waited + 1
+            if waited == patience:
+                print("mini-batch SGD converged after " + str(epoch + 1) + " epochs")
+                break
+    return best_theta
+
+# fit theta to X_new (with the column of ones) and y with the chosen solver, see fit_linear_regression
+def solve (X_new, y, solver, iterations, alpha, tol, batch_size, seed):
+    if solver == 'lstsq':
+        return least_squares(X_new, y)
+    elif solver == 'qr':
+        return qr_solve(X_new, y)
+    elif solver == 'gradient':
+        return gradient_descent(X_new, y, iterations, alpha, tol)
+    elif solver == 'sgd':
+        return minibatch_sgd(X_new, y, iterations, alpha, tol, batch_size, seed)
+    else:
+        raise ValueError("unknown solver: " + str(solver))
+
+# start a figure, importing matplotlib on first use. with a plot_dir the figure is a standalone Figure drawn by
+# the Agg canvas, so pyplot and its process-wide backend are never touched and a caller's own figures are left alone
+def new_figure (plot_dir):
+    if plot_dir is None:
+        import matplotlib.pyplot as plt
+        return plt.figure()
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return figure
+
+# show the figure in a window, or write it to plot_dir/name when plot_dir is given
+def finish_plot (figure, plot_dir, name):
+    if plot_dir is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+        plt.close(figure)
+    else:
+        os.makedirs(plot_dir, exist_ok=True)
+        figure.savefig(os.path.join(plot_dir, name))
+        print("Plot written to " + os.path.join(plot_dir, name))
+
 # function to fit regression line to data
-def fit_linear_regression (data_file):
+# solver is 'lstsq' or 'qr' for the closed-form solution, 'gradient' for full-batch gradient descent
+# or 'sgd' for mini-batch gradient descent. iterations (epochs for 'sgd') is only an upper bound for the
+# iterative solvers, they stop as soon as they converge
+# with plot=False matplotlib is never imported, with a plot_dir the plots are written there instead of shown
+def fit_linear_regression (data_file, solver='lstsq', iterations=1500, alpha=0.01, tol=1e-6, batch_size=32, seed=0, plot=True, plot_dir=None):
     data = pd.read_csv(data_file, header = None, dtype='float64')
 
     X = data[[0]].to_numpy()
@@ -17,33 +111,140 @@ def fit_linear_regression (data_file):
     N = len(y)
 
     # plot data
-    plt.scatter(X, y)
-    plt.show()
+    if plot:
+        figure = new_figure(plot_dir)
+        axes = figure.add_subplot()
+        axes.scatter(X, y)
+        finish_plot(figure, plot_dir, 'data.png')
 
     X_new = np.hstack([np.ones((N,1)), X])
 
-    # gradient descent parameters
-    iterations = 1500
-    alpha = 0.01
-
     global theta
 
-    # gradient descent
-    for i in range(0,iterations):
-        h = X_new @ theta
-        error = h - y
-        theta_change = alpha * (1/N) * X_new.T @ error
-        theta = theta - theta_change
+    theta = solve(X_new, y, solver, iterations, alpha, tol, batch_size, seed)
     
     print(np.array2string(theta[0])[1:-1])
     print("The fitted line has the equation: y = " + np.array2string(theta[0])[1:-1] + " + " + np.array2string(theta[1])[1:-1] + " x")
 
     # plot fitted regression line against data
-    x = np.linspace(X.min(), X.max(), 50)
-    y_fit = theta[0] + theta[1] * x
-    plt.scatter(X, y)
-    plt.plot(x, y_fit, '-r')
-    plt.show()
+    if plot:
+        x = np.linspace(X.min(), X.max(), 50)
+        y_fit = theta[0] + theta[1] * x
+        figure = new_figure(plot_dir)
+        axes = figure.add_subplot()
+        axes.scatter(X, y)
+        axes.plot(x, y_fit, '-r')
+        finish_plot(figure, plot_dir, 'fit.png')
+
+# read the data file chunksize rows at a time, yields X_new (with the column of ones) and y for each chunk
+def read_chunks (data_file, chunksize):
+    for chunk in pd.read_csv(data_file, header = None, dtype='float64', chunksize=chunksize):
+        X = chunk[[0]].to_numpy()
+        y = chunk[[1]].to_numpy()
+        yield np.hstack([np.ones((len(y),1)), X]), y
+
+# mean squared error of theta over the whole data file and the number of rows, one pass over the chunks
+def streaming_cost (data_file, chunksize, theta):
+    squared_error = 0
+    N = 0
+    for X_new, y in read_chunks(data_file, chunksize):
+        squared_error = squared_error + float(np.sum((X_new @ theta - y) ** 2))
+        N = N + len(y)
+    return squared_error / N, N
+
+# function to fit regression line to a data file that does not fit in memory, only one chunk is held at a time
+# solver 'normal' accumulates X^T X and X^T y over the chunks in a single pass and solves the normal equations,
+# solver 'sgd' runs mini-batch gradient descent over the chunks, one pass over the file per epoch. the chunks always
+# come in file order, so with a sorted file or small chunks the steps can keep circling the optimum: decay shrinks
+# the learning rate to alpha / (1 + decay * epoch) to settle it
+def fit_linear_regression_streaming (data_file, solver='normal', chunksize=100000, iterations=1500, alpha=0.01, tol=1e-6, batch_size=32, seed=0, patience=50, decay=0.0):
+    global theta
+
+    if solver == 'normal':
+        XtX = np.zeros((2,2))
+        Xty = np.zeros((2,1))
+        N = 0
+        for X_new, y in read_chunks(data_file, chunksize):
+            XtX = XtX + X_new.T @ X_new
+            Xty = Xty + X_new.T @ y
+            N = N + len(y)
+        theta = np.linalg.lstsq(XtX, Xty, rcond=None)[0] #lstsq rather than solve, in case every x is the same
+    elif solver == 'sgd':
+        rng = np.random.default_rng(seed)
+        theta = np.zeros((2,1))
+        best_theta = theta
+        best_cost = None
+        waited = 0
+        converged = False
+        for epoch in range(0,iterations):
+            # each chunk is also scored with the parameters the epoch started from, before any update, so the
+            # pass gives the exact cost over the file of the previous epoch's parameters at no extra read
+            start_theta = theta
+            epoch_alpha = alpha / (1 + decay * epoch)
+            squared_error = 0
+            N = 0
+            for X_new, y in read_chunks(data_file, chunksize):
+                squared_error = squared_error + float(np.sum((X_new @ start_theta - y) ** 2))
+                order = rng.permutation(len(y))
+                for start in range(0, len(y), batch_size):
+                    batch = order[start:start + batch_size]
+                    error = X_new[batch] @ theta - y[batch]
+                    theta = theta - epoch_alpha * (1/len(batch)) * X_new[batch].T @ error
+                N = N + len(y)
+            cost = squared_error / N
+            if best_cost is None or cost < best_cost * (1 - tol):
+                best_theta = start_theta
+                best_cost = cost
+                waited = 0
+            else:
+                waited = waited + 1
+                if waited == patience:
+                    print("streaming mini-batch SGD converged after " + str(epoch + 1) + " epochs")
+                    converged = True
+                    break
+        if not converged:
+            # the parameters of the last epoch have not been scored yet
+            cost, N = streaming_cost(data_file, chunksize, theta)
+            if best_cost is None or cost < best_cost:
+                best_theta = theta
+        theta = best_theta
+    else:
+        raise ValueError("unknown solver: " + str(solver))
+
+    print("The fitted line over " + str(N) + " rows has the equation: y = " + np.array2string(theta[0])[1:-1] + " + " + np.array2string(theta[1])[1:-1] + " x")
+
+# linear regression model with any number of features, theta[0] is the intercept and theta[1:] the feature weights
+class LinearRegressionModel(object):
+    def __init__(self, theta=None):
+        self.theta = theta
+
+    # fit to an (N, n) array of N rows of n features and N responses, with the same solvers as fit_linear_regression
+    def fit(self, X, y, solver='lstsq', iterations=1500, alpha=0.01, tol=1e-6, batch_size=32, seed=0):
+        X = np.asarray(X, dtype='float64')
+        if X.ndim == 1:
+            X = X.reshape(-1, 1)
+        y = np.asarray(y, dtype='float64').reshape(-1, 1)
+        X_new = np.hstack([np.ones((len(y),1)), X])
+        self.theta = solve(X_new, y, solver, iterations, alpha, tol, batch_size, seed)
+        return self
+
+    # return the predicted responses for an (N, n) array in one matrix product, without copying X into X_new
+    # a scalar or 1D array is read as rows of n features, so for a single feature model it is N inputs
+    def predict(self, X):
+        X = np.asarray(X, dtype='float64')
+        if X.ndim < 2:
+            X = X.reshape(-1, self.theta.shape[0] - 1)
+        return X @ self.theta[1:, 0] + self.theta[0, 0]
+
+    # write theta to a .npy file, so a service can load it and predict without refitting
+    def save(self, path):
+        with open(path, 'wb') as file:
+            np.save(file, self.theta)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as file:
+            return LinearRegressionModel(np.load(file))
 
 # function to predict response values from certain input variables
 def predict_response(x):
@@ -51,6 +252,15 @@ def predict_response(x):
     print("The predicted response for " + str(x) + " is: " + np.array2string(result)[1:-1])
 
 if __name__ == '__main__':
-    mpl.use('tkagg') #fixed an error I was having: 'segmentation fault'
-    fit_linear_regression('data.txt')
+    parser = argparse.ArgumentParser(description='Fit a regression line to a CSV file of x,y rows')
+    parser.add_argument('--data', default='data.txt')
+    parser.add_argument('--solver', choices=['lstsq', 'qr', 'gradient', 'sgd'], default='lstsq')
+    parser.add_argument('--plot-dir', help='write the plots as PNG files here instead of showing them, no GUI needed')
+    parser.add_argument('--no-plot', action='store_true', help='skip plotting, matplotlib is not imported')
+    args = parser.parse_args()
+
+    if not args.no_plot and args.plot_dir is None:
+        import matplotlib as mpl
+        mpl.use('tkagg') #fixed an error I was having: 'segmentation fault'
+    fit_linear_regression(args.data, solver=args.solver, plot=not args.no_plot, plot_dir=args.plot_dir)
     predict_response(35000)